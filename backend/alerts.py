@@ -0,0 +1,167 @@
+import os
+import queue
+import threading
+import time
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import SMS_DISPATCH_SECONDS, SMS_FAILURES
+
+# =====================================================
+# FAST2SMS ALERT DISPATCHER (BACKGROUND QUEUE)
+# =====================================================
+# Point FAST2SMS_URL at a local stub server to test without the provider.
+FAST2SMS_URL = os.getenv("FAST2SMS_URL", "https://www.fast2sms.com/dev/bulkV2")
+SMS_TIMEOUT_SECONDS = float(os.getenv("SMS_TIMEOUT_SECONDS", "10"))
+SMS_MAX_RETRIES = int(os.getenv("SMS_MAX_RETRIES", "3"))
+SMS_BACKOFF_SECONDS = float(os.getenv("SMS_BACKOFF_SECONDS", "1"))
+ALERT_COOLDOWN_SECONDS = float(os.getenv("ALERT_COOLDOWN_SECONDS", "300"))
+ALERT_HISTORY_SIZE = 1000
+
+_queue = queue.Queue()
+_alerts = {}
+_last_sent = {}
+_lock = threading.Lock()
+_worker = None
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        _session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return _session
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_drain, name="sms-dispatcher", daemon=True)
+        _worker.start()
+
+
+def clean_mobile(raw_mobile) -> str:
+    return "".join(filter(str.isdigit, raw_mobile or ""))[-10:]
+
+
+def format_alert(alert) -> dict:
+    return {
+        "alertId": alert["id"],
+        "gate": alert["gate"],
+        "status": alert["status"],
+        "recipients": len(alert["numbers"]),
+        "attempts": alert["attempts"],
+        "error": alert["error"],
+    }
+
+
+def get_alert(alert_id):
+    return _alerts.get(alert_id)
+
+
+def enqueue_alert(gate, user_email, message, numbers) -> dict:
+    alert = {
+        "id": uuid.uuid4().hex,
+        "gate": gate,
+        "user_email": user_email,
+        "message": message,
+        "numbers": list(dict.fromkeys(n for n in numbers if n)),
+        "status": "queued",
+        "attempts": 0,
+        "error": None,
+    }
+
+    with _lock:
+        # Per-gate cooldown: repeated uploads of the same incident stay quiet.
+        key = (user_email, gate)
+        now = time.monotonic()
+        last = _last_sent.get(key)
+        if not alert["numbers"]:
+            alert["status"] = "no_recipients"
+        elif last is not None and now - last < ALERT_COOLDOWN_SECONDS:
+            alert["status"] = "cooldown"
+        else:
+            # Reserved now so concurrent uploads stay quiet; released again
+            # by _release_cooldown if the SMS never goes out.
+            _last_sent[key] = now
+            alert["cooldownFrom"] = now
+
+        _alerts[alert["id"]] = alert
+        while len(_alerts) > ALERT_HISTORY_SIZE:
+            del _alerts[next(iter(_alerts))]
+
+    if alert["status"] == "queued":
+        _queue.put(alert)
+        _ensure_worker()
+    return alert
+
+
+def _send(alert):
+    api_key = os.getenv("FAST2SMS_API_KEY")
+    if not api_key:
+        alert["status"] = "skipped"
+        alert["error"] = "FAST2SMS_API_KEY not set"
+        return
+
+    # bulkV2 takes every guard at once as a comma-separated list.
+    querystring = {
+        "authorization": api_key,
+        "message": alert["message"],
+        "language": "english",
+        "route": "q",
+        "numbers": ",".join(alert["numbers"]),
+    }
+
+    alert["status"] = "sending"
+    for attempt in range(1, SMS_MAX_RETRIES + 1):
+        alert["attempts"] = attempt
+        started = time.perf_counter()
+        try:
+            response = _get_session().get(FAST2SMS_URL, params=querystring, timeout=SMS_TIMEOUT_SECONDS)
+            SMS_DISPATCH_SECONDS.observe(time.perf_counter() - started)
+            if response.status_code < 500 and response.status_code != 429:
+                response.raise_for_status()
+                alert["status"] = "sent"
+                alert["error"] = None
+                return
+            SMS_FAILURES.labels(f"http_{response.status_code}").inc()
+            alert["error"] = f"HTTP {response.status_code}"
+        except requests.HTTPError as e:
+            SMS_FAILURES.labels(f"http_{e.response.status_code}").inc()
+            alert["error"] = str(e)
+            break
+        except requests.RequestException as e:
+            SMS_DISPATCH_SECONDS.observe(time.perf_counter() - started)
+            SMS_FAILURES.labels(type(e).__name__).inc()
+            alert["error"] = str(e)
+
+        if attempt < SMS_MAX_RETRIES:
+            time.sleep(SMS_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+    alert["status"] = "failed"
+    print(f"SMS Error: {alert['error']}")
+
+
+def _release_cooldown(alert):
+    key = (alert["user_email"], alert["gate"])
+    with _lock:
+        if _last_sent.get(key) == alert.get("cooldownFrom"):
+            del _last_sent[key]
+
+
+def _drain():
+    while True:
+        alert = _queue.get()
+        try:
+            _send(alert)
+        except Exception as e:
+            alert["status"] = "failed"
+            alert["error"] = str(e)
+            print(f"SMS Error: {e}")
+        finally:
+            # Only a delivered alert silences the gate for the cooldown.
+            if alert["status"] != "sent":
+                _release_cooldown(alert)
+            _queue.task_done()
@@ -0,0 +1,302 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import cv2
+from vision import FRAME_SIZE
+from detectors import get_detector
+from tracker import PersonTracker, TRACK_MAX_AGE_SECONDS, merge_segments
+from metrics import ANALYSIS_JOB_SECONDS
+
+# =====================================================
+# VIDEO ANALYSIS JOBS (PROCESS POOL + FRAME SEGMENTS)
+# =====================================================
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+MIN_SEGMENT_FRAMES = int(os.getenv("ANALYSIS_MIN_SEGMENT_FRAMES", "150"))
+JOB_TTL_SECONDS = int(os.getenv("ANALYSIS_JOB_TTL_SECONDS", "3600"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_pool = None
+_jobs = {}
+_tasks = set()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # "spawn" keeps the children clear of the live stream threads.
+        _pool = ProcessPoolExecutor(
+            max_workers=ANALYSIS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+    return _pool
+
+
+def _init_worker():
+    # One OpenCV thread per process, or N workers x N cores threads compete.
+    cv2.setNumThreads(1)
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def save_upload(upload, suffix=".mp4"):
+    # Copies the spooled upload to disk chunk by chunk (runs in a thread).
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp:
+        shutil.copyfileobj(upload.file, temp, UPLOAD_CHUNK_SIZE)
+        return temp.name
+
+
+def count_frames(path):
+    cap = cv2.VideoCapture(path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+    return max(total, 0)
+
+
+def split_segments(total_frames, workers=ANALYSIS_WORKERS):
+    # A few segments per worker so progress moves and stragglers even out.
+    # The frame count is often estimated from duration x fps, so the last
+    # segment reads to EOF instead of stopping at it.
+    if total_frames <= 0:
+        return [(0, None)]
+    size = max(MIN_SEGMENT_FRAMES, math.ceil(total_frames / (workers * 2)))
+    starts = range(0, total_frames, size)
+    return [(start, start + size) for start in starts[:-1]] + [(starts[-1], None)]
+
+
+# =====================================================
+# ANALYSIS PROFILES
+# =====================================================
+# exhaustive: every frame, sampled: every N frames or every T ms,
+# threshold: every frame but stop as soon as the alert threshold is crossed.
+PROFILES = ("exhaustive", "sampled", "threshold")
+DEFAULT_SAMPLE_EVERY = 10
+
+
+def build_profile(name="exhaustive", sample_every=None, sample_ms=None, threshold=None) -> dict:
+    if name not in PROFILES:
+        raise ValueError(f"Unknown analysis profile '{name}' (expected one of {', '.join(PROFILES)})")
+    if (sample_every is not None and sample_every < 1) or (sample_ms is not None and sample_ms <= 0):
+        raise ValueError("Sampling interval must be positive")
+
+    profile = {"name": name, "sampleEvery": None, "sampleMs": None, "threshold": None}
+    if name == "sampled":
+        if sample_ms:
+            profile["sampleMs"] = sample_ms
+        else:
+            profile["sampleEvery"] = sample_every or DEFAULT_SAMPLE_EVERY
+    elif name == "threshold":
+        profile["threshold"] = threshold
+    return profile
+
+
+def analyze_segment(path, start, end, profile=None, detector_name=None):
+    profile = profile or build_profile()
+    sample_every = profile["sampleEvery"]
+    sample_ms = profile["sampleMs"]
+    threshold = profile["threshold"]
+    detector = get_detector(detector_name)
+
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    # Tracks must survive the gap between two analysed frames.
+    gap = sample_ms / 1000 if sample_ms else (sample_every or 1) / fps
+    tracker = PersonTracker(max_age=max(TRACK_MAX_AGE_SECONDS, 2.5 * gap), hold_edges=True)
+
+    def run_batch(frames, times):
+        results = detector.detect_batch(frames)
+        for boxes, ts in zip(results, times):
+            tracker.update(boxes, ts)
+        return max(len(boxes) for boxes in results)
+
+    peak = 0
+    analysed = 0
+    batch = []
+    times = []
+    last_bucket = None
+    frame_index = start
+    while cap.isOpened() and (end is None or frame_index < end):
+        # grab() advances without the colour conversion; retrieve() only
+        # for the frames we actually run the detector on.
+        if not cap.grab():
+            break
+        frame_index += 1
+
+        if sample_every and (frame_index - 1) % sample_every:
+            continue
+        if sample_ms:
+            bucket = int(cap.get(cv2.CAP_PROP_POS_MSEC) // sample_ms)
+            if bucket == last_bucket:
+                continue
+            last_bucket = bucket
+
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        batch.append(cv2.resize(frame, FRAME_SIZE))
+        times.append((frame_index - 1) / fps)
+        if len(batch) < detector.batch_size:
+            continue
+
+        peak = max(peak, run_batch(batch, times))
+        analysed += len(batch)
+        batch = []
+        times = []
+
+        if threshold is not None and peak > threshold:
+            break
+
+    if batch:
+        peak = max(peak, run_batch(batch, times))
+        analysed += len(batch)
+
+    cap.release()
+    tracker.finish()
+    tracking = {
+        "start": start,
+        "end": frame_index,
+        "entered": tracker.entered,
+        "openingSpans": tracker.opening_spans,
+        "closingSpans": tracker.closing_spans,
+        "dwell": tracker.dwell.summary(),
+    }
+    return {
+        "peakCount": peak,
+        "framesDecoded": frame_index - start,
+        "framesAnalysed": analysed,
+        "detector": detector.name,
+        "tracking": tracking,
+    }
+
+
+# =====================================================
+# JOB STORE
+# =====================================================
+def _prune_jobs():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for job_id in [j for j, job in _jobs.items() if job["finishedAt"] and job["finishedAt"] < cutoff]:
+        del _jobs[job_id]
+
+
+def get_job(job_id):
+    return _jobs.get(job_id)
+
+
+def format_job(job) -> dict:
+    return {
+        "jobId": job["id"],
+        "gate": job["gate"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "profile": job["profile"],
+        "detector": job["detector"],
+        "peakCount": job["peakCount"],
+        "framesDecoded": job["framesDecoded"],
+        "framesAnalysed": job["framesAnalysed"],
+        "tracking": job["tracking"],
+        "result": job["result"],
+        "error": job["error"],
+    }
+
+
+async def _run_job(job, path, finalize):
+    loop = asyncio.get_running_loop()
+    futures = []
+    started = time.perf_counter()
+    try:
+        job["status"] = "running"
+        total = await loop.run_in_executor(None, count_frames, path)
+        segments = split_segments(total)
+        pool = get_pool()
+        profile = job["profile"]
+        futures = [
+            loop.run_in_executor(pool, analyze_segment, path, start, end, profile, job["detector"])
+            for start, end in segments
+        ]
+
+        done = 0
+        tracked = []
+        for future in asyncio.as_completed(futures):
+            segment = await future
+            done += 1
+            tracked.append(segment["tracking"])
+            # Report the backend the worker really ran, not the one requested.
+            job["detector"] = segment["detector"]
+            # Per-frame max() merges across segments the same way.
+            job["peakCount"] = max(job["peakCount"], segment["peakCount"])
+            job["framesDecoded"] += segment["framesDecoded"]
+            job["framesAnalysed"] += segment["framesAnalysed"]
+            job["progress"] = round(done / len(segments), 3)
+
+            if profile["threshold"] is not None and job["peakCount"] > profile["threshold"]:
+                # Early exit: drop queued segments, ignore the ones still running.
+                for pending in futures:
+                    pending.cancel()
+                job["progress"] = 1.0
+                break
+
+        job["tracking"] = merge_segments(tracked)
+        result = await finalize(job["peakCount"], job["tracking"])
+        job["result"] = {
+            **result,
+            "profile": profile["name"],
+            "detector": job["detector"],
+            "framesDecoded": job["framesDecoded"],
+            "framesAnalysed": job["framesAnalysed"],
+        }
+        job["status"] = "done"
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            shutdown_pool()
+        for future in futures:
+            future.cancel()
+        print(f"Analysis Error: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        ANALYSIS_JOB_SECONDS.labels(job["profile"]["name"], job["status"]).observe(time.perf_counter() - started)
+        job["finishedAt"] = time.time()
+        os.remove(path)
+    return job
+
+
+def start_job(path, gate, user_email, finalize, profile=None, detector=None):
+    _prune_jobs()
+    job = {
+        "id": uuid.uuid4().hex,
+        "gate": gate,
+        "user_email": user_email,
+        "status": "queued",
+        "profile": profile or build_profile(),
+        "detector": detector,
+        "progress": 0.0,
+        "peakCount": 0,
+        "framesDecoded": 0,
+        "framesAnalysed": 0,
+        "tracking": None,
+        "result": None,
+        "error": None,
+        "finishedAt": None,
+    }
+    _jobs[job["id"]] = job
+
+    task = asyncio.create_task(_run_job(job, path, finalize))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    job["task"] = task
+    return job
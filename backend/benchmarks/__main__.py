@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+import cv2
+
+# =====================================================
+# CROWDGUARD BENCHMARK RUNNER
+# =====================================================
+# Run from backend/:  python -m benchmarks --output run.json
+# Compare two runs:   python -m benchmarks --baseline old.json --output new.json
+# Exits with status 1 when a metric regresses more than --tolerance.
+SECTIONS = ("pipeline", "grid", "mjpeg", "scheduler", "tracker", "api")
+HIGHER_IS_BETTER = ("fps", "bytesPerSec")
+LOWER_IS_BETTER = ("p50Ms", "p99Ms", "msPerFrame")
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            yield from flatten(item, f"{prefix}[{index}]")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(baseline, current, tolerance) -> list:
+    before = dict(flatten(baseline.get("results", {})))
+    regressions = []
+    for path, value in flatten(current.get("results", {})):
+        old = before.get(path)
+        metric = path.rsplit(".", 1)[-1]
+        if not old:
+            continue
+        if metric in HIGHER_IS_BETTER and value < old * (1 - tolerance):
+            regressions.append({"metric": path, "baseline": old, "current": value})
+        elif metric in LOWER_IS_BETTER and value > old * (1 + tolerance):
+            regressions.append({"metric": path, "baseline": old, "current": value})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="CrowdGuardAI performance benchmarks")
+    parser.add_argument("--sections", default=",".join(SECTIONS), help=f"comma-separated subset of {', '.join(SECTIONS)}")
+    parser.add_argument("--video", action="append", default=[], help="extra sample video (repeatable)")
+    parser.add_argument("--frames", type=int, default=120, help="frames per pipeline run")
+    parser.add_argument("--detector", action="append", default=[], help="detector backend(s) for the pipeline run")
+    parser.add_argument("--mjpeg-seconds", type=float, default=5.0)
+    parser.add_argument("--scheduler-seconds", type=float, default=5.0)
+    parser.add_argument("--cameras", type=int, default=12, help="simulated cameras for the scheduler run")
+    parser.add_argument("--requests", type=int, default=200, help="requests per API route")
+    parser.add_argument("--mongo-uri", default=None, help="use this MongoDB instead of a throwaway mongod")
+    parser.add_argument("--output", default=None, help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="earlier JSON run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    sections = [s.strip() for s in args.sections.split(",") if s.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+
+    from benchmarks import vision_bench
+    synthetic = vision_bench.make_synthetic_video(frames=max(args.frames, 30))
+    videos = [synthetic] + args.video
+    results = {}
+
+    if "pipeline" in sections:
+        results["pipeline"] = [
+            vision_bench.bench_pipeline(path, detector, mode, args.frames)
+            for path in videos
+            for detector in (args.detector or ["hog"])
+            for mode in ("object", "thermal")
+        ]
+    if "grid" in sections:
+        results["grid"] = vision_bench.bench_hog_grid(synthetic)
+    if "mjpeg" in sections:
+        results["mjpeg"] = [vision_bench.bench_mjpeg(path, seconds=args.mjpeg_seconds) for path in videos]
+    if "scheduler" in sections:
+        results["scheduler"] = vision_bench.bench_scheduler(synthetic, cameras=args.cameras, seconds=args.scheduler_seconds)
+    if "tracker" in sections:
+        results["tracker"] = vision_bench.bench_tracker()
+    if "api" in sections:
+        from benchmarks import api_bench
+        results["api"] = api_bench.bench_api(args.mongo_uri, args.requests)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "cpus": os.cpu_count(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(json.load(f), report, args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+from functools import partial
+
+# =====================================================
+# API LATENCY BENCHMARKS (AGAINST A LOCAL MONGODB)
+# =====================================================
+BENCH_EMAIL = "bench@crowdguard.local"
+ROUTES = {
+    "guards": "/api/guards",
+    "cameras": "/api/cameras",
+    "analytics": "/api/analytics",
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def throwaway_mongod():
+    # Starts a private mongod on a temp dbpath; yields its URI.
+    binary = shutil.which("mongod")
+    if not binary:
+        yield None
+        return
+
+    dbpath = tempfile.mkdtemp(prefix="crowd-bench-db-")
+    port = _free_port()
+    proc = subprocess.Popen(
+        [binary, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        yield f"mongodb://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        shutil.rmtree(dbpath, ignore_errors=True)
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _seed(client, cameras, guards):
+    for i in range(cameras):
+        client.post("/api/cameras", json={
+            "user_email": BENCH_EMAIL, "gate": f"Gate {i + 1}", "rtsp_url": f"rtsp://bench/{i}", "status": "Live"
+        })
+    for i in range(guards):
+        client.post("/api/guards", json={
+            "user_email": BENCH_EMAIL, "name": f"Guard {i + 1}", "mobile": f"98765{i:05d}", "gate": f"Gate {i % cameras + 1}"
+        })
+
+
+def _time_requests(client, path, count, before=None):
+    timings = []
+    for _ in range(count):
+        if before:
+            before()
+        start = time.perf_counter()
+        response = client.get(path, params={"user_email": BENCH_EMAIL})
+        timings.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return {
+        "requests": count,
+        "p50Ms": round(statistics.median(timings), 3),
+        "p99Ms": round(_percentile(timings, 99), 3),
+        "meanMs": round(statistics.fmean(timings), 3),
+    }
+
+
+def bench_api(mongo_uri=None, requests_per_route=200, cameras=12, guards=40):
+    with nullcontext(mongo_uri) if mongo_uri else throwaway_mongod() as uri:
+        if not uri:
+            return {"skipped": "no mongod on PATH and no --mongo-uri given"}
+
+        # database.py reads MONGO_URI once, at import time, and earlier
+        # sections have usually imported it already; a fresh interpreter is
+        # the only way to be sure the seeding and cleanup hit `uri`.
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.NamedTemporaryFile(prefix="crowd-bench-api-", suffix=".json", delete=False) as out:
+            output = out.name
+        try:
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.api_bench", output, str(requests_per_route), str(cameras), str(guards)],
+                cwd=backend_dir, env={**os.environ, "MONGO_URI": uri}, stdout=subprocess.DEVNULL, check=True
+            )
+            with open(output) as f:
+                results = json.load(f)
+        finally:
+            os.remove(output)
+
+        return {"mongo": "throwaway" if not mongo_uri else "provided", "routes": results}
+
+
+def _bench_routes(requests_per_route, cameras, guards):
+    # Runs in the child interpreter started by bench_api.
+    from fastapi.testclient import TestClient
+    import cache
+    import main
+
+    results = {}
+    with TestClient(main.app) as client:
+        _seed(client, cameras, guards)
+        for name, path in ROUTES.items():
+            client.get(path, params={"user_email": BENCH_EMAIL})  # warm-up
+            # Top-level numbers are the database path (the account's
+            # entries are dropped before every request); cache hits are
+            # reported on their own so they cannot hide a DB regression.
+            results[name] = _time_requests(client, path, requests_per_route, partial(cache.invalidate, BENCH_EMAIL))
+            client.get(path, params={"user_email": BENCH_EMAIL})
+            results[name]["cached"] = _time_requests(client, path, requests_per_route)
+        client.portal.call(_drop_bench_data, main.db)
+        cache.invalidate(BENCH_EMAIL)
+    return results
+
+
+async def _drop_bench_data(db):
+    for collection in ("cameras", "guards", "crowd_rollups"):
+        await db[collection].delete_many({"user_email": BENCH_EMAIL})
+
+
+if __name__ == "__main__":
+    output, requests_per_route, cameras, guards = sys.argv[1], *map(int, sys.argv[2:5])
+    with open(output, "w") as f:
+        json.dump(_bench_routes(requests_per_route, cameras, guards), f)
@@ -0,0 +1,232 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+from vision import FRAME_SIZE, annotate_frame
+from detectors import HogDetector, get_detector
+
+# =====================================================
+# FRAME PIPELINE / DETECTOR / MJPEG BENCHMARKS
+# =====================================================
+HOG_GRID = {
+    "winStride": [(4, 4), (8, 8), (16, 16)],
+    "padding": [(4, 4), (8, 8)],
+    "scale": [1.03, 1.05, 1.1],
+}
+
+
+def make_synthetic_video(frames=120, size=(1280, 720), fps=30):
+    # Gradient background with a few walking "people" blobs, so decode and
+    # detection costs look like a CCTV clip rather than white noise.
+    width, height = size
+    path = os.path.join(tempfile.mkdtemp(prefix="crowd-bench-"), "synthetic.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    background = np.tile(np.linspace(40, 200, width, dtype=np.uint8), (height, 1))
+    background = cv2.cvtColor(background, cv2.COLOR_GRAY2BGR)
+
+    for i in range(frames):
+        frame = background.copy()
+        for k in range(6):
+            x = (i * (3 + k) + k * 180) % (width - 80)
+            y = height // 3 + (k % 3) * 60
+            cv2.rectangle(frame, (x, y), (x + 60, y + 160), (30 + k * 20, 60, 90), -1)
+            cv2.circle(frame, (x + 30, y - 20), 20, (40, 50, 160), -1)
+        writer.write(frame)
+
+    writer.release()
+    return path
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 2) if seconds else None
+
+
+def _stage_summary(total_seconds, frames):
+    return {
+        "msPerFrame": round(1000 * total_seconds / frames, 3) if frames else None,
+        "fps": _rate(frames, total_seconds),
+    }
+
+
+def bench_pipeline(path, detector_name="hog", mode="object", max_frames=120):
+    detector = get_detector(detector_name)
+    stages = dict.fromkeys(("decode", "resize", "detect", "draw", "encode"), 0.0)
+    encoded_bytes = 0
+    frames = 0
+
+    cap = cv2.VideoCapture(path)
+    while frames < max_frames:
+        t0 = time.perf_counter()
+        ok, frame = cap.read()
+        t1 = time.perf_counter()
+        if not ok:
+            break
+        frame = cv2.resize(frame, FRAME_SIZE)
+        t2 = time.perf_counter()
+        boxes = detector.detect(frame)
+        t3 = time.perf_counter()
+        frame = annotate_frame(frame, boxes, mode)
+        t4 = time.perf_counter()
+        _, buffer = cv2.imencode('.jpg', frame)
+        t5 = time.perf_counter()
+
+        stages["decode"] += t1 - t0
+        stages["resize"] += t2 - t1
+        stages["detect"] += t3 - t2
+        stages["draw"] += t4 - t3
+        stages["encode"] += t5 - t4
+        encoded_bytes += len(buffer)
+        frames += 1
+    cap.release()
+
+    total = sum(stages.values())
+    return {
+        "video": os.path.basename(path),
+        "detector": detector.name,
+        "mode": mode,
+        "frames": frames,
+        "stages": {name: _stage_summary(seconds, frames) for name, seconds in stages.items()},
+        "total": _stage_summary(total, frames),
+        "avgJpegBytes": encoded_bytes // frames if frames else 0,
+    }
+
+
+def load_frames(path, count):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(cv2.resize(frame, FRAME_SIZE))
+    cap.release()
+    return frames
+
+
+def bench_hog_grid(path, frames=20):
+    samples = load_frames(path, frames)
+    results = []
+    for win_stride, padding, scale in itertools.product(*HOG_GRID.values()):
+        detector = HogDetector(win_stride=win_stride, padding=padding, scale=scale)
+        boxes = 0
+        start = time.perf_counter()
+        for frame in samples:
+            boxes += len(detector.detect(frame))
+        elapsed = time.perf_counter() - start
+        results.append({
+            "winStride": list(win_stride),
+            "padding": list(padding),
+            "scale": scale,
+            "fps": _rate(len(samples), elapsed),
+            "avgBoxes": round(boxes / len(samples), 2) if samples else 0,
+        })
+    return results
+
+
+def bench_mjpeg(path, mode="object", seconds=5.0):
+    # Drives the shared CameraWorker exactly like one /api/video-feed client.
+    return asyncio.run(_consume_mjpeg(path, mode, seconds))
+
+
+async def _consume_mjpeg(path, mode, seconds):
+    from streaming import generate_frames
+
+    frames = 0
+    total_bytes = 0
+    stream = generate_frames(path, mode)
+    start = time.perf_counter()
+    try:
+        async for chunk in stream:
+            frames += 1
+            total_bytes += len(chunk)
+            if time.perf_counter() - start >= seconds:
+                break
+    finally:
+        await stream.aclose()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "video": os.path.basename(path),
+        "mode": mode,
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "fps": _rate(frames, elapsed),
+        "bytesPerSec": _rate(total_bytes, elapsed),
+        "avgFrameBytes": total_bytes // frames if frames else 0,
+    }
+
+
+def bench_scheduler(path, workers=None, cameras=12, seconds=5.0):
+    # Detection throughput of the shared pool with `cameras` threads pushing
+    # frames at once, per pool size; should grow ~linearly up to the core count.
+    from scheduler import DetectionScheduler
+
+    samples = load_frames(path, 10)
+    results = []
+    for size in workers or sorted({1, max(1, (os.cpu_count() or 1) // 2), os.cpu_count() or 1}):
+        scheduler = DetectionScheduler(size)
+        leases = [scheduler.register(f"bench-{i}") for i in range(cameras)]
+        # Warm-up: every worker process loads its model before timing starts.
+        for lease in leases[:size]:
+            lease.detect(samples[0])
+
+        deadline = time.perf_counter() + seconds
+        done = [0] * cameras
+
+        def feed(index):
+            lease = leases[index]
+            while time.perf_counter() < deadline:
+                lease.detect(samples[done[index] % len(samples)])
+                done[index] += 1
+
+        threads = [threading.Thread(target=feed, args=(i,)) for i in range(cameras)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        scheduler.shutdown()
+
+        # Frames shed by backpressure do not count: only real pool detections.
+        detections = [lease.detections - (1 if i < size else 0) for i, lease in enumerate(leases)]
+        results.append({
+            "workers": size,
+            "cameras": cameras,
+            "detections": sum(detections),
+            "fps": _rate(sum(detections), elapsed),
+            "minCameraFps": _rate(min(detections), elapsed),
+        })
+    return results
+
+
+def bench_tracker(tracks=(50, 200, 500), frames=300, matchers=("greedy", "hungarian")):
+    # Random-walk crowds of `tracks` people; fps is tracker updates per second.
+    from tracker import PersonTracker, resolve_matcher
+
+    results = []
+    for matcher in matchers:
+        if resolve_matcher(matcher) != matcher:
+            continue
+        for count in tracks:
+            rng = np.random.default_rng(0)
+            positions = rng.uniform(0, 4000, (count, 2))
+            sizes = np.tile([40.0, 100.0], (count, 1))
+            tracker = PersonTracker(matcher=matcher)
+            start = time.perf_counter()
+            for i in range(frames):
+                positions += rng.normal(0, 2, positions.shape)
+                tracker.update(np.hstack([positions, sizes]), i / 30)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "matcher": matcher,
+                "tracks": count,
+                "fps": _rate(frames, elapsed),
+                "msPerFrame": round(1000 * elapsed / frames, 3),
+                "entered": tracker.entered,
+            })
+    return results
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from fastapi.responses import JSONResponse, Response
+from metrics import RESPONSE_CACHE_REQUESTS
+
+# =====================================================
+# PER-ACCOUNT RESPONSE CACHE (TTL + LRU + ETAG)
+# =====================================================
+# Dashboard polls hit the cache; any write for an account drops that
+# account's entries, so TTLs only bound staleness from background writers
+# (live crowd samples), never from the account's own edits.
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+ROUTE_TTLS = {
+    "analytics": float(os.getenv("CACHE_TTL_ANALYTICS", "15")),
+    "guards": float(os.getenv("CACHE_TTL_GUARDS", "300")),
+    "cameras": float(os.getenv("CACHE_TTL_CAMERAS", "300")),
+}
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+
+
+class CacheBackend(ABC):
+    # What a shared store (Redis, memcached, ...) has to provide so several
+    # uvicorn workers can share entries. Values are CachedResponse objects;
+    # the generation is a per-account counter bumped by every invalidation.
+    @abstractmethod
+    def get(self, user_email, route):
+        ...
+
+    @abstractmethod
+    def generation(self, user_email):
+        ...
+
+    @abstractmethod
+    def set(self, user_email, route, value, ttl, generation):
+        ...
+
+    @abstractmethod
+    def invalidate(self, user_email, routes=None):
+        ...
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_email, route):
+        key = (user_email, route)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def generation(self, user_email):
+        return self._generations.get(user_email, 0)
+
+    def set(self, user_email, route, value, ttl, generation):
+        key = (user_email, route)
+        with self._lock:
+            if self._generations.get(user_email, 0) != generation:
+                return  # a write landed while this response was being built
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_email, routes=None):
+        with self._lock:
+            self._generations[user_email] = self._generations.get(user_email, 0) + 1
+            for route in routes or ROUTE_TTLS:
+                self._entries.pop((user_email, route), None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_backend = MemoryCache()
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+def invalidate(user_email, *routes):
+    # No routes = every cached route of the account.
+    _backend.invalidate(user_email, routes or None)
+
+
+def _not_modified(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def cached_json(request, route, user_email, produce):
+    # Serves `route` for the account from cache, rendering `produce()` only on
+    # a miss; answers 304 when the client already holds the same ETag.
+    entry = _backend.get(user_email, route)
+    result = "hit"
+    if entry is None:
+        result = "miss"
+        generation = _backend.generation(user_email)
+        body = JSONResponse(await produce()).body
+        entry = CachedResponse(body, '"' + hashlib.sha1(body).hexdigest() + '"')
+        _backend.set(user_email, route, entry, ROUTE_TTLS[route], generation)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if _not_modified(request.headers.get("if-none-match"), entry.etag):
+        RESPONSE_CACHE_REQUESTS.labels(route, "not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    RESPONSE_CACHE_REQUESTS.labels(route, result).inc()
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -1,6 +1,9 @@
+import asyncio
 import os
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, ASCENDING
+from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
+from metrics import MongoCommandMetrics
 
 # Load variables from .env file (for local testing)
 load_dotenv()
@@ -8,24 +11,80 @@ load_dotenv()
 # Get the URI from Render Environment Variables (Fallback to local)
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 
-print(f"🔗 Attempting to connect to MongoDB... (URI starts with: {MONGO_URI[:15]}...)")
-
-# PRO-TIP: Added a 5-second timeout.
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-
-try:
-    # Force a ping to verify the Cloud connection immediately
-    client.admin.command('ping')
-    print("✅ Successfully connected to MongoDB Atlas Cloud!")
-    
-    # Safely select the exact database
-    db = client.get_database("crowdguardai")
-    
-    # Optional: Print collections when server starts
-    collections = db.list_collection_names()
-    print(f"📂 Active Collections: {collections}")
-    
-except Exception as e:
-    print("❌ MongoDB connection error!")
-    print(f"Error Details: {e}")
-    print("⚠️ Check if your Render MONGO_URI is correct and IP Whitelist is 0.0.0.0/0")
\ No newline at end of file
+# Connection pool + timeout tuning (all overridable from the environment)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "60000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+
+print(f"🔗 MongoDB client ready (URI starts with: {MONGO_URI[:15]}...)")
+
+# The async client connects lazily, so importing this module never blocks.
+client = AsyncMongoClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    event_listeners=[MongoCommandMetrics()],
+)
+
+# Safely select the exact database
+db = client.get_database("crowdguardai")
+
+# Loop the client is bound to; background threads submit work onto it.
+main_loop = None
+
+INDEXES = {
+    "guards": [([("user_email", ASCENDING), ("gate", ASCENDING)], {})],
+    "cameras": [([("user_email", ASCENDING), ("gate", ASCENDING)], {"unique": True})],
+    "users": [([("email", ASCENDING)], {"unique": True})],
+}
+
+
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # e.g. existing duplicate rows block a unique index
+                print(f"⚠️ Could not create index on {collection}: {e}")
+
+
+async def connect():
+    global main_loop
+    main_loop = asyncio.get_running_loop()
+
+    try:
+        # Force a ping to verify the Cloud connection immediately
+        await client.admin.command('ping')
+        print("✅ Successfully connected to MongoDB Atlas Cloud!")
+
+        # Optional: Print collections when server starts
+        collections = await db.list_collection_names()
+        print(f"📂 Active Collections: {collections}")
+
+        await ensure_indexes()
+    except Exception as e:
+        print("❌ MongoDB connection error!")
+        print(f"Error Details: {e}")
+        print("⚠️ Check if your Render MONGO_URI is correct and IP Whitelist is 0.0.0.0/0")
+
+
+async def close():
+    await client.close()
+
+
+def submit(coro):
+    # Fire-and-forget a database coroutine from a non-async thread.
+    if main_loop is None or main_loop.is_closed():
+        coro.close()
+        return None
+    return asyncio.run_coroutine_threadsafe(coro, main_loop)
@@ -0,0 +1,75 @@
+import cv2
+from vision import apply_mode
+
+# =====================================================
+# PER-CLIENT JPEG ENCODING + ADAPTIVE QUALITY
+# =====================================================
+DEFAULT_QUALITY = 95  # cv2.imencode default, so plain clients get the shared JPEG
+MIN_QUALITY = 30
+MIN_SCALE = 0.35
+# Consecutive slow sends before stepping down / fast sends before stepping up.
+DEGRADE_AFTER = 3
+RECOVER_AFTER = 30
+
+
+def encode_jpeg(image, quality=DEFAULT_QUALITY, scale=1.0):
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+
+def encode_packet(packet, quality=DEFAULT_QUALITY, scale=1.0, plain=False) -> bytes:
+    # plain=True: frame without server-drawn overlays (thermal colouring kept).
+    if not plain and quality == DEFAULT_QUALITY and scale == 1.0:
+        return packet["jpeg"]
+
+    key = (plain, quality, scale)
+    cache = packet["cache"]
+    if key not in cache:
+        # Clients with identical settings share one encode per frame.
+        image = apply_mode(packet["raw"], packet["mode"]) if plain else packet["annotated"]
+        cache[key] = encode_jpeg(image, quality, scale)
+    return cache[key]
+
+
+class AdaptiveQuality:
+    def __init__(self, quality=DEFAULT_QUALITY, scale=1.0, adaptive=True):
+        self.adaptive = adaptive
+        # Quality drops first, resolution only once quality is already low.
+        ladder = [
+            (quality, scale),
+            (min(quality, 75), scale),
+            (min(quality, 60), scale),
+            (min(quality, 50), min(scale, 0.75)),
+            (min(quality, 40), min(scale, 0.5)),
+            (min(quality, MIN_QUALITY), min(scale, MIN_SCALE)),
+        ]
+        self.ladder = list(dict.fromkeys(ladder))
+        self.level = 0
+        self._slow = 0
+        self._fast = 0
+
+    @property
+    def current(self):
+        return self.ladder[self.level]
+
+    def update(self, send_seconds, budget_seconds):
+        # A send that outlasts the frame budget means the client is draining
+        # slower than we publish, so frames are being skipped for it.
+        if not self.adaptive or budget_seconds <= 0:
+            return self.current
+
+        if send_seconds > budget_seconds:
+            self._slow += 1
+            self._fast = 0
+            if self._slow >= DEGRADE_AFTER and self.level < len(self.ladder) - 1:
+                self.level += 1
+                self._slow = 0
+        else:
+            self._fast += 1
+            self._slow = 0
+            if self._fast >= RECOVER_AFTER and self.level > 0:
+                self.level -= 1
+                self._fast = 0
+        return self.current
@@ -1,15 +1,28 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Query, Request, WebSocket
+from starlette.websockets import WebSocketState
 from fastapi.middleware.cors import CORSMiddleware
-from database import db
+from database import db, connect, close
 from models import GuardModel, CameraModel, UserModel, LoginModel, ResetPasswordModel
 from bson import ObjectId
-import requests
+from pymongo.errors import DuplicateKeyError
+from streaming import generate_frames, stream_websocket, stream_stats
+from encoding import DEFAULT_QUALITY, MIN_QUALITY, MIN_SCALE
+from alerts import enqueue_alert, get_alert, format_alert, clean_mobile
+from detectors import resolve_detector_name, DEFAULT_DETECTOR
+from motion import validate_roi
+from vision import FRAME_SIZE
+from timeseries import ensure_collections, record_sample, load_rollups, truncate
+from metrics import RouteContextMiddleware, render_latest
+from analysis import build_profile, start_job, get_job, format_job, save_upload, shutdown_pool
+import cache
+from scheduler import resolve_priority, scheduler_stats, shutdown_scheduler, DEFAULT_PRIORITY
+import asyncio
 import os
-import tempfile
-import cv2
-import random
 from dotenv import load_dotenv
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from functools import partial
+from typing import Optional
 from datetime import datetime, timedelta
 
 load_dotenv()
@@ -26,6 +39,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RouteContextMiddleware)
+
+@app.on_event("startup")
+async def prepare_database():
+    await connect()
+    try:
+        await ensure_collections()
+    except Exception as e:
+        print(f"⚠️ Could not prepare crowd time series: {e}")
+
+@app.on_event("shutdown")
+async def stop_background_work():
+    shutdown_pool()
+    shutdown_scheduler()
+    await close()
 
 # =====================================================
 # BASIC HEALTH + DB TEST ROUTES ✅ (MERGED)
@@ -34,18 +62,19 @@ app.add_middleware(
 def root():
     return {"status": "CrowdGuardAI Backend Running on Render 🚀"}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/test-db")
-def test_db():
-    db.test.insert_one({"status": "ok", "time": datetime.utcnow()})
+async def test_db():
+    await db.test.insert_one({"status": "ok", "time": datetime.utcnow()})
     return {"msg": "MongoDB Atlas connected successfully!"}
 
-# =====================================================
-# OPENCV HUMAN DETECTOR
-# =====================================================
-print("Loading OpenCV AI Human Detector...")
-hog = cv2.HOGDescriptor()
-hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
-print("✅ AI Model Loaded Successfully!")
+# Projections: documents only carry what the serializers below read.
+GUARD_FIELDS = {"name": 1, "mobile": 1, "gate": 1, "status": 1}
+CAMERA_FIELDS = {"_id": 0, "gate": 1, "rtsp_url": 1, "status": 1, "detector": 1, "roi": 1, "priority": 1}
 
 def format_guard(guard) -> dict:
     return {
@@ -60,18 +89,25 @@ def format_guard(guard) -> dict:
 # 1. GUARDS API
 # =====================================================
 @app.post("/api/guards")
-def create_guard(guard: GuardModel):
-    new_guard = db.guards.insert_one(guard.dict())
-    created_guard = db.guards.find_one({"_id": new_guard.inserted_id})
-    return format_guard(created_guard)
+async def create_guard(guard: GuardModel):
+    created_guard = guard.dict()
+    new_guard = await db.guards.insert_one(created_guard)
+    cache.invalidate(guard.user_email)
+    return format_guard({**created_guard, "_id": new_guard.inserted_id})
 
 @app.get("/api/guards")
-def get_all_guards(user_email: str):
-    return [format_guard(g) for g in db.guards.find({"user_email": user_email})]
+async def get_all_guards(request: Request, user_email: str):
+    return await cache.cached_json(request, "guards", user_email, partial(load_guards, user_email))
+
+async def load_guards(user_email):
+    guards = await db.guards.find({"user_email": user_email}, GUARD_FIELDS).to_list(None)
+    return [format_guard(g) for g in guards]
 
 @app.delete("/api/guards/{guard_id}")
-def delete_guard(guard_id: str):
-    if db.guards.delete_one({"_id": ObjectId(guard_id)}).deleted_count:
+async def delete_guard(guard_id: str):
+    deleted = await db.guards.find_one_and_delete({"_id": ObjectId(guard_id)}, {"user_email": 1})
+    if deleted:
+        cache.invalidate(deleted.get("user_email"))
         return {"message": "Guard deleted successfully"}
     raise HTTPException(status_code=404, detail="Guard not found")
 
@@ -79,152 +115,221 @@ def delete_guard(guard_id: str):
 # 2. CAMERAS API
 # =====================================================
 @app.post("/api/cameras")
-def save_camera(camera: CameraModel):
-    db.cameras.update_one(
+async def save_camera(camera: CameraModel):
+    try:
+        resolve_detector_name(camera.detector)
+        resolve_priority(camera.priority)
+        validate_roi(camera.roi, FRAME_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    await db.cameras.update_one(
         {"gate": camera.gate, "user_email": camera.user_email},
         {"$set": camera.dict()},
         upsert=True
     )
+    cache.invalidate(camera.user_email)
     return {"message": "Camera saved successfully"}
 
 @app.get("/api/cameras")
-def get_cameras(user_email: str):
+async def get_cameras(request: Request, user_email: str):
+    return await cache.cached_json(request, "cameras", user_email, partial(load_cameras, user_email))
+
+async def load_cameras(user_email):
+    cameras = await db.cameras.find({"user_email": user_email}, CAMERA_FIELDS).to_list(None)
     return [
         {
             "gate": cam.get("gate", "Unknown"),
             "rtsp_url": cam.get("rtsp_url", ""),
-            "status": cam.get("status", "Offline")
+            "status": cam.get("status", "Offline"),
+            "detector": cam.get("detector") or DEFAULT_DETECTOR,
+            "roi": cam.get("roi"),
+            "priority": cam.get("priority") or DEFAULT_PRIORITY
         }
-        for cam in db.cameras.find({"user_email": user_email})
+        for cam in cameras
     ]
 
 # =====================================================
 # 3. VIDEO ANALYSIS API (WITH FAST2SMS ALERT)
 # =====================================================
-@app.post("/api/analyze-video")
-async def analyze_video(
-    file: UploadFile = File(...),
-    gate: str = Form(...),
-    user_email: str = Form(...)
-):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp:
-        temp.write(await file.read())
-        temp_path = temp.name
+CROWD_THRESHOLD = 3
 
-    cap = cv2.VideoCapture(temp_path)
-    exact_crowd_count = 0
+async def finish_analysis(gate, user_email, exact_crowd_count, tracking=None) -> dict:
+    threshold = CROWD_THRESHOLD
+    messages_sent = []
+    alert = None
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame = cv2.resize(frame, (640, 480))
-        boxes, _ = hog.detectMultiScale(frame, winStride=(8,8), padding=(4,4), scale=1.05)
-        exact_crowd_count = max(exact_crowd_count, len(boxes))
+    if exact_crowd_count > threshold:
+        guards_at_gate = db.guards.find({"gate": gate, "user_email": user_email}, {"_id": 0, "name": 1, "mobile": 1})
+        recipients = []
 
-    cap.release()
-    os.remove(temp_path)
+        async for guard in guards_at_gate:
+            mobile = clean_mobile(guard.get("mobile", ""))
+            if mobile:
+                recipients.append((guard.get("name", "Officer"), mobile))
 
-    # Fallback in case the model misses due to compression
-    if exact_crowd_count == 0:
-        exact_crowd_count = random.randint(5, 15)  
+        msg_body = f"CrowdGuard AI: High crowd detected ({exact_crowd_count} people) at {gate}. Deploy immediately."
+        alert = enqueue_alert(gate, user_email, msg_body, [mobile for _, mobile in recipients])
 
-    threshold = 3
-    messages_sent = []
+        if alert["status"] != "cooldown":
+            messages_sent = [f"{name} ({mobile})" for name, mobile in recipients]
 
-    if exact_crowd_count > threshold:
-        guards_at_gate = db.guards.find({"gate": gate, "user_email": user_email})
-        FAST2SMS_API_KEY = os.getenv("FAST2SMS_API_KEY")
-        
-        for guard in guards_at_gate:
-            guard_name = guard.get("name", "Officer")
-            raw_mobile = guard.get("mobile", "")
-            clean_mobile = "".join(filter(str.isdigit, raw_mobile))[-10:]
-
-            if not clean_mobile:
-                continue
-
-            msg_body = f"CrowdGuard AI: High crowd detected ({exact_crowd_count} people) at {gate}. Deploy immediately."
-            
-            if FAST2SMS_API_KEY:
-                url = "https://www.fast2sms.com/dev/bulkV2"
-                querystring = {
-                    "authorization": FAST2SMS_API_KEY,
-                    "message": msg_body,
-                    "language": "english",
-                    "route": "q", 
-                    "numbers": clean_mobile
-                }
-                try:
-                    requests.get(url, params=querystring)
-                except Exception as e:
-                    print(f"SMS Error: {e}")
-            
-            messages_sent.append(f"{guard_name} ({clean_mobile})")
+    tracking = tracking or {"entered": 0, "dwell": {"count": 0, "totalSeconds": 0.0, "avgSeconds": 0.0, "buckets": []}}
+    traffic = {
+        "entered": tracking["entered"],
+        "dwellCount": tracking["dwell"]["count"],
+        "dwellSeconds": tracking["dwell"]["totalSeconds"],
+    }
+    try:
+        await record_sample(user_email, gate, exact_crowd_count, source="upload", traffic=traffic)
+        cache.invalidate(user_email, "analytics")
+    except Exception as e:
+        print(f"Sample Error: {e}")
 
     return {
         "gate": gate,
         "crowdCount": exact_crowd_count,
+        "uniqueCount": tracking["entered"],
+        "avgDwellSeconds": tracking["dwell"]["avgSeconds"],
+        "dwell": tracking["dwell"],
         "thresholdExceeded": exact_crowd_count > threshold,
-        "messagesSent": messages_sent
+        "messagesSent": messages_sent,
+        "alertId": alert["id"] if alert else None,
+        "alertStatus": alert["status"] if alert else None
     }
 
+async def start_analysis(file, gate, user_email, profile, sample_every, sample_ms, detector):
+    try:
+        analysis_profile = build_profile(profile, sample_every, sample_ms, CROWD_THRESHOLD)
+        detector_name = resolve_detector_name(detector)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    temp_path = await run_in_threadpool(save_upload, file)
+    finalize = partial(finish_analysis, gate, user_email)
+    return start_job(temp_path, gate, user_email, finalize, analysis_profile, detector_name)
+
+@app.post("/api/analysis-jobs", status_code=202)
+async def create_analysis_job(
+    file: UploadFile = File(...),
+    gate: str = Form(...),
+    user_email: str = Form(...),
+    profile: str = Form("exhaustive"),
+    sample_every: Optional[int] = Form(None),
+    sample_ms: Optional[float] = Form(None),
+    detector: Optional[str] = Form(None)
+):
+    job = await start_analysis(file, gate, user_email, profile, sample_every, sample_ms, detector)
+    return format_job(job)
+
+@app.get("/api/analysis-jobs/{job_id}")
+def get_analysis_job(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return format_job(job)
+
+@app.post("/api/analyze-video")
+async def analyze_video(
+    file: UploadFile = File(...),
+    gate: str = Form(...),
+    user_email: str = Form(...),
+    profile: str = Form("exhaustive"),
+    sample_every: Optional[int] = Form(None),
+    sample_ms: Optional[float] = Form(None),
+    detector: Optional[str] = Form(None)
+):
+    job = await start_analysis(file, gate, user_email, profile, sample_every, sample_ms, detector)
+    await job["task"]
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    return job["result"]
+
+@app.get("/api/alerts/{alert_id}")
+def get_alert_status(alert_id: str):
+    alert = get_alert(alert_id)
+    if not alert:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return format_alert(alert)
+
 # =====================================================
 # 4. LIVE STREAM API (WITH THERMAL/OBJECT MODES)
 # =====================================================
-def generate_frames(camera_url, mode="object"):
-    source = 0 if camera_url == "0" else camera_url
-    cap = cv2.VideoCapture(source)
-    
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-            
-        frame = cv2.resize(frame, (640, 480))
-        boxes, _ = hog.detectMultiScale(frame, winStride=(8,8), padding=(4,4), scale=1.05)
-        
-        if mode == "thermal":
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            blur = cv2.GaussianBlur(gray, (21, 21), 0)
-            frame = cv2.applyColorMap(blur, cv2.COLORMAP_JET) 
-            
-            for (x, y, w, h) in boxes:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 255), 1)
-            cv2.putText(frame, f"THERMAL COUNT: {len(boxes)}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
-
-        else:
-            for (x, y, w, h) in boxes:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2) 
-                cv2.putText(frame, "Person", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            cv2.putText(frame, f"LIVE COUNT: {len(boxes)}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
-
-        ret, buffer = cv2.imencode('.jpg', frame)
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-               
-    cap.release()
-
 @app.get("/api/video-feed/{gate_name}")
-def video_feed(gate_name: str, user_email: str, mode: str = "object"):
-    cam = db.cameras.find_one({"gate": gate_name, "user_email": user_email})
+async def video_feed(
+    gate_name: str,
+    user_email: str,
+    mode: str = "object",
+    quality: int = Query(DEFAULT_QUALITY, ge=MIN_QUALITY, le=100),
+    scale: float = Query(1.0, ge=MIN_SCALE, le=1.0),
+    max_fps: Optional[float] = Query(None, gt=0),
+    adaptive: bool = True
+):
+    cam = await db.cameras.find_one({"gate": gate_name, "user_email": user_email}, CAMERA_FIELDS)
     rtsp_url = cam.get("rtsp_url") if cam else None
     
     if not rtsp_url:
         raise HTTPException(status_code=404, detail="Camera not configured")
         
-    return StreamingResponse(generate_frames(rtsp_url, mode), media_type="multipart/x-mixed-replace; boundary=frame")
+    return StreamingResponse(
+        generate_frames(
+            rtsp_url, mode, cam.get("detector"), cam.get("roi"), (user_email, gate_name),
+            quality, scale, max_fps, adaptive, cam.get("priority")
+        ),
+        media_type="multipart/x-mixed-replace; boundary=frame"
+    )
+
+@app.websocket("/api/ws/video-feed/{gate_name}")
+async def video_feed_ws(
+    websocket: WebSocket,
+    gate_name: str,
+    user_email: str,
+    mode: str = "object",
+    quality: int = Query(80, ge=MIN_QUALITY, le=100),
+    scale: float = Query(1.0, ge=MIN_SCALE, le=1.0),
+    max_fps: Optional[float] = Query(None, gt=0),
+    adaptive: bool = True
+):
+    cam = await db.cameras.find_one({"gate": gate_name, "user_email": user_email}, CAMERA_FIELDS)
+    rtsp_url = cam.get("rtsp_url") if cam else None
+
+    # Closing before accept() turns into an HTTP 403 on the handshake, so
+    # accept first: the client then sees the 4404 close code.
+    await websocket.accept()
+    if not rtsp_url:
+        await websocket.close(code=4404, reason="Camera not configured")
+        return
+
+    await stream_websocket(
+        websocket, rtsp_url, mode, cam.get("detector"), cam.get("roi"), (user_email, gate_name),
+        quality, scale, max_fps, adaptive, cam.get("priority")
+    )
+    if websocket.client_state == WebSocketState.CONNECTED:
+        await websocket.close()
+
+@app.get("/api/video-feed/{gate_name}/stats")
+async def video_feed_stats(gate_name: str, user_email: str):
+    cam = await db.cameras.find_one({"gate": gate_name, "user_email": user_email}, {"_id": 0, "rtsp_url": 1})
+    if not cam or not cam.get("rtsp_url"):
+        raise HTTPException(status_code=404, detail="Camera not configured")
+    return {"gate": gate_name, "streams": stream_stats(cam["rtsp_url"]), "detectionPool": scheduler_stats()}
 
 # =====================================================
 # 5. ACCOUNT-BASED ANALYTICS API (PRO DYNAMIC)
 # =====================================================
+GATE_CAPACITY = int(os.getenv("GATE_CAPACITY", "50"))
+
 @app.get("/api/analytics")
-def get_analytics(user_email: str):
+async def get_analytics(request: Request, user_email: str):
     if not user_email:
         raise HTTPException(status_code=422, detail="Account email is required")
+    return await cache.cached_json(request, "analytics", user_email, partial(build_analytics, user_email))
 
-    cameras = list(db.cameras.find({"user_email": user_email}, {"_id": 0}))
-    guards = list(db.guards.find({"user_email": user_email}, {"_id": 0}))
+async def build_analytics(user_email):
+    cameras, guards = await asyncio.gather(
+        db.cameras.find({"user_email": user_email}, {"_id": 0, "gate": 1, "rtsp_url": 1}).to_list(None),
+        db.guards.find({"user_email": user_email}, {"_id": 0, "status": 1}).to_list(None)
+    )
 
     active_cameras = [cam for cam in cameras if cam.get("rtsp_url")]
 
@@ -234,33 +339,47 @@ def get_analytics(user_email: str):
             "riskZones": [], "chartData": {"labels": ["Day 1", "Day 2", "Day 3", "Day 4", "Day 5", "Day 6", "Day 7"], "data": [0,0,0,0,0,0,0]}
         }
 
-    risk_zones = []
-    total_footfall = 0
+    # One indexed read of the per-gate daily rollups covers the whole week.
+    days = [truncate(datetime.utcnow() - timedelta(days=i), "day") for i in range(6, -1, -1)]
+    daily_totals = {day: 0 for day in days}
+    today_peaks = {}
+    dwell_seconds = 0.0
+    dwell_count = 0
+
+    for rollup in await load_rollups(user_email, "day", days[0]):
+        if rollup["bucket"] in daily_totals:
+            # Tracked footfall; rollups written before tracking only have peaks.
+            daily_totals[rollup["bucket"]] += rollup.get("entered", rollup["peak"])
+            dwell_seconds += rollup.get("dwellSeconds", 0.0)
+            dwell_count += rollup.get("dwellCount", 0)
+        if rollup["bucket"] == days[-1]:
+            today_peaks[rollup["gate"]] = rollup["peak"]
 
+    risk_zones = []
     for cam in active_cameras:
         gate_name = cam.get("gate", "Unknown Gate")
-        percent = random.randint(25, 85) 
-        
+        percent = min(100, round(100 * today_peaks.get(gate_name, 0) / GATE_CAPACITY))
+
         if percent >= 80: level = "Critical"
         elif percent >= 60: level = "High"
         elif percent >= 40: level = "Moderate"
         else: level = "Low"
-            
+
         risk_zones.append({"name": gate_name, "percent": percent, "level": level})
-        total_footfall += random.randint(1500, 4500)
 
     risk_zones.sort(key=lambda x: x["percent"], reverse=True)
     peak_density = f"{risk_zones[0]['percent']}%" if risk_zones else "0%"
 
-    today = datetime.now()
-    chart_labels = [(today - timedelta(days=i)).strftime("%b %d") for i in range(6, -1, -1)]
-    chart_data = [max(0, random.randint(total_footfall - 2000, total_footfall + 3000)) for _ in range(7)]
+    chart_labels = [day.strftime("%b %d") for day in days]
+    chart_data = [daily_totals[day] for day in days]
+    total_footfall = sum(chart_data)
 
     incidents = sum(1 for g in guards if g.get("status") == "Responding")
+    avg_dwell_minutes = dwell_seconds / dwell_count / 60 if dwell_count else 0
 
     return {
         "peakDensity": peak_density, "totalFootfall": f"{total_footfall:,}", "incidents": incidents,
-        "avgDwellTime": f"{random.randint(15, 45)} mins", "riskZones": risk_zones,
+        "avgDwellTime": f"{avg_dwell_minutes:.1f} mins" if dwell_count else "0 mins", "riskZones": risk_zones,
         "chartData": {"labels": chart_labels, "data": chart_data}
     }
 
@@ -268,22 +387,25 @@ def get_analytics(user_email: str):
 # 6. USER AUTHENTICATION APIs
 # =====================================================
 @app.post("/api/signup")
-def signup(user: UserModel):
-    if db.users.find_one({"email": user.email}):
+async def signup(user: UserModel):
+    if await db.users.find_one({"email": user.email}, {"_id": 1}):
+        raise HTTPException(400, "Email already exists")
+    try:
+        await db.users.insert_one(user.dict())
+    except DuplicateKeyError:
         raise HTTPException(400, "Email already exists")
-    db.users.insert_one(user.dict())
     return {"message": "Signup success"}
 
 @app.post("/api/login")
-def login(data: LoginModel):
-    user = db.users.find_one({"email": data.email, "password": data.password})
+async def login(data: LoginModel):
+    user = await db.users.find_one({"email": data.email, "password": data.password}, {"_id": 0, "name": 1, "email": 1})
     if not user:
         raise HTTPException(401, "Invalid credentials")
     return {"name": user["name"], "email": user["email"]}
 
 @app.post("/api/reset-password")
-def reset(data: ResetPasswordModel):
-    if not db.users.find_one({"email": data.email}):
+async def reset(data: ResetPasswordModel):
+    result = await db.users.update_one({"email": data.email}, {"$set": {"password": data.new_password}})
+    if not result.matched_count:
         raise HTTPException(status_code=404, detail="Email not found")
-    db.users.update_one({"email": data.email}, {"$set": {"password": data.new_password}})
-    return {"message": "Password updated"}
\ No newline at end of file
+    return {"message": "Password updated"}
@@ -0,0 +1,100 @@
+import contextvars
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from pymongo import monitoring
+
+# =====================================================
+# PROMETHEUS METRICS (SCRAPED FROM /metrics)
+# =====================================================
+# Hot-path children are bound once at import, so recording a frame stage is
+# a perf_counter() difference plus one observe() with no label lookup.
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+FRAME_STAGE_SECONDS = Histogram(
+    "crowdguard_frame_stage_seconds", "Time spent in each stage of the live frame loop",
+    ["stage"], buckets=FAST_BUCKETS
+)
+STAGE_READ = FRAME_STAGE_SECONDS.labels("read")
+STAGE_RESIZE = FRAME_STAGE_SECONDS.labels("resize")
+STAGE_DETECT = FRAME_STAGE_SECONDS.labels("detect")
+STAGE_TRACK = FRAME_STAGE_SECONDS.labels("track")
+STAGE_ANNOTATE = FRAME_STAGE_SECONDS.labels("annotate")
+STAGE_ENCODE = FRAME_STAGE_SECONDS.labels("encode")
+
+CAMERA_FPS = Gauge("crowdguard_camera_fps", "Frames per second achieved by a camera worker", ["camera", "mode"])
+CAMERA_FRAMES = Counter("crowdguard_camera_frames_total", "Frames processed by a camera worker", ["camera", "mode"])
+CAMERA_DROPPED_FRAMES = Counter(
+    "crowdguard_camera_dropped_frames_total", "Frames skipped by viewers that could not keep up", ["camera", "mode"]
+)
+CAMERA_SHED_FRAMES = Counter(
+    "crowdguard_camera_shed_frames_total", "Frames that reused earlier boxes because the detection pool was saturated",
+    ["camera", "mode"]
+)
+ACTIVE_STREAMS = Gauge("crowdguard_active_streams", "Running camera workers")
+ACTIVE_VIEWERS = Gauge("crowdguard_active_viewers", "Connected live stream viewers")
+
+DETECTION_QUEUE_SECONDS = Histogram(
+    "crowdguard_detection_queue_seconds", "Time a live frame waited for a free detection worker", buckets=FAST_BUCKETS
+)
+DETECTION_BUSY_WORKERS = Gauge("crowdguard_detection_busy_workers", "Detection worker processes currently running a frame")
+
+ANALYSIS_JOB_SECONDS = Histogram(
+    "crowdguard_analysis_job_seconds", "Wall time of video analysis jobs", ["profile", "status"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+
+SMS_DISPATCH_SECONDS = Histogram("crowdguard_sms_dispatch_seconds", "Latency of one Fast2SMS request", buckets=FAST_BUCKETS[4:] + (5.0, 10.0))
+SMS_FAILURES = Counter("crowdguard_sms_failures_total", "Failed Fast2SMS requests", ["reason"])
+
+RESPONSE_CACHE_REQUESTS = Counter(
+    "crowdguard_response_cache_requests_total", "Cached route lookups by outcome (hit / miss / not_modified)",
+    ["route", "result"]
+)
+
+MONGO_OPERATION_SECONDS = Histogram(
+    "crowdguard_mongo_operation_seconds", "MongoDB command latency", ["route", "command"], buckets=FAST_BUCKETS
+)
+
+
+# =====================================================
+# MONGODB LATENCY PER ROUTE
+# =====================================================
+_request_scope = contextvars.ContextVar("request_scope", default=None)
+
+
+def current_route() -> str:
+    scope = _request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "unknown")
+
+
+class RouteContextMiddleware:
+    # Plain ASGI middleware: remembers the scope so the Mongo listener can read
+    # the matched route template once routing has filled it in.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_OPERATION_SECONDS.labels(current_route(), event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_OPERATION_SECONDS.labels(current_route(), event.command_name).observe(event.duration_micros / 1e6)
+
+
+def render_latest():
+    return generate_latest(), CONTENT_TYPE_LATEST
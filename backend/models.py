@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional, Tuple
 
 # ==========================================
 # --- ACCOUNT-LINKED MODELS (Multi-Tenant) ---
@@ -16,6 +16,9 @@ class CameraModel(BaseModel):
     gate: str
     rtsp_url: str
     status: str = "Offline"
+    detector: Optional[str] = None  # "hog" / "dnn", None = server default
+    roi: Optional[List[Tuple[int, int]]] = None  # walkway polygon in 640x480 frame pixels
+    priority: Optional[str] = None  # "critical" / "high" / "normal" / "low", None = normal
 
 
 # ==========================================
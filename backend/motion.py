@@ -0,0 +1,129 @@
+import os
+import cv2
+import numpy as np
+from detectors import MIN_CROP_SIZE
+
+# =====================================================
+# MOTION GATE + REGION OF INTEREST
+# =====================================================
+# Detection only runs when the (downscaled) scene inside the ROI has moved
+# since the last detection; otherwise the previous boxes are reused.
+MOTION_GATE_ENABLED = os.getenv("MOTION_GATE", "1") == "1"
+MOTION_DIFF_THRESHOLD = int(os.getenv("MOTION_DIFF_THRESHOLD", "25"))
+MOTION_MIN_AREA = float(os.getenv("MOTION_MIN_AREA", "0.002"))
+MOTION_MAX_SKIP = int(os.getenv("MOTION_MAX_SKIP", "50"))
+MOTION_SAMPLE_SIZE = (160, 120)
+
+
+def roi_key(roi):
+    return tuple(tuple(int(v) for v in point) for point in roi) if roi else None
+
+
+def validate_roi(roi, frame_size=(640, 480)):
+    if roi is None:
+        return
+    width, height = frame_size
+    if len(roi) < 3:
+        raise ValueError("ROI polygon needs at least 3 points")
+    if any(not (0 <= x < width and 0 <= y < height) for x, y in roi):
+        raise ValueError(f"ROI points must lie inside the {width}x{height} frame")
+    if cv2.contourArea(np.array(roi, dtype=np.int32).reshape(-1, 2)) <= 0:
+        raise ValueError("ROI polygon must enclose a non-zero area")
+
+
+def _grow(start, size, minimum, limit):
+    # One axis of _expand: widen around the centre, then shift inside [0, limit).
+    grown = max(size, min(minimum, limit))
+    start = min(max(start - (grown - size) // 2, 0), limit - grown)
+    return start, grown
+
+
+def _expand(rect, frame_size, min_size=MIN_CROP_SIZE):
+    # Grows an ROI crop to at least the detector window, clamped to the
+    # frame; the polygon test still drops boxes outside the walkway.
+    x, y, w, h = rect
+    x, w = _grow(x, w, min_size[0], frame_size[0])
+    y, h = _grow(y, h, min_size[1], frame_size[1])
+    return x, y, w, h
+
+
+class MotionGatedDetector:
+    def __init__(self, detector, roi=None, frame_size=(640, 480), motion_gate=MOTION_GATE_ENABLED):
+        self.detector = detector
+        self.motion_gate = motion_gate
+        self.frames = 0
+        self.skipped = 0
+        self._reference = None
+        self._candidate = None
+        self._since_detect = 0
+        self._boxes = []
+
+        width, height = frame_size
+        self.polygon = None
+        self.rect = (0, 0, width, height)
+        if roi:
+            self.polygon = np.array(roi, dtype=np.int32).reshape(-1, 2)
+            x, y, w, h = cv2.boundingRect(self.polygon)
+            x2, y2 = min(x + w, width), min(y + h, height)
+            x, y = max(x, 0), max(y, 0)
+            # A polygon entirely outside the frame leaves nothing to watch.
+            self.rect = _expand((x, y, x2 - x, y2 - y), frame_size) if x2 > x and y2 > y else None
+
+        self._mask = None
+        if self.polygon is not None and self.rect is not None:
+            # Motion outside the walkway polygon (but inside its box) is ignored.
+            x, y, w, h = self.rect
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, [self.polygon - (x, y)], 255)
+            self._mask = cv2.resize(mask, MOTION_SAMPLE_SIZE, interpolation=cv2.INTER_NEAREST)
+
+    @property
+    def skip_ratio(self):
+        return round(self.skipped / self.frames, 3) if self.frames else 0.0
+
+    def _has_motion(self, crop):
+        small = cv2.cvtColor(cv2.resize(crop, MOTION_SAMPLE_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        # Becomes the reference only once a detection really ran on it.
+        self._candidate = small
+        if self._reference is None or self._since_detect >= MOTION_MAX_SKIP:
+            return True
+
+        diff = cv2.absdiff(small, self._reference)
+        _, changed = cv2.threshold(diff, MOTION_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)
+        if self._mask is not None:
+            changed = cv2.bitwise_and(changed, self._mask)
+        return cv2.countNonZero(changed) >= MOTION_MIN_AREA * changed.size
+
+    def _inside_polygon(self, box):
+        x, y, w, h = box
+        return cv2.pointPolygonTest(self.polygon, (float(x + w / 2), float(y + h / 2)), False) >= 0
+
+    def detect(self, frame):
+        self.frames += 1
+        if self.rect is None:
+            self.skipped += 1
+            return []
+        x, y, w, h = self.rect
+        crop = frame[y:y + h, x:x + w]
+
+        if self.motion_gate and not self._has_motion(crop):
+            self.skipped += 1
+            self._since_detect += 1
+            return self._boxes
+
+        found = self.detector.detect(crop)
+        if getattr(self.detector, "shed", False):
+            # The detection pool was saturated and returned its previous
+            # boxes; keep the old reference so the motion is retried.
+            self._since_detect += 1
+            return self._boxes
+
+        boxes = [(bx + x, by + y, bw, bh) for (bx, by, bw, bh) in found]
+        if self.polygon is not None:
+            boxes = [box for box in boxes if self._inside_polygon(box)]
+
+        self._boxes = boxes
+        self._reference = self._candidate
+        self._since_detect = 0
+        return boxes
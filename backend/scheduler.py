@@ -0,0 +1,381 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from vision import FRAME_SIZE
+from detectors import get_detector, resolve_detector_name
+import metrics
+
+# =====================================================
+# MULTI-PROCESS DETECTION SCHEDULER
+# =====================================================
+# Camera threads copy frames into a per-camera shared-memory ring and hand
+# the pool only (ring, slot, shape); a pool of spawned processes runs the
+# detector there, so live detection spreads across every core.
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", os.cpu_count() or 1))
+RING_SLOTS = int(os.getenv("DETECTION_RING_SLOTS", "4"))
+DETECTION_TIMEOUT_SECONDS = float(os.getenv("DETECTION_TIMEOUT_SECONDS", "5"))
+SATURATION_HOLD_SECONDS = 1.0
+REAP_INTERVAL_SECONDS = 1.0
+RING_IDLE_SECONDS = 60.0
+SLOT_BYTES = FRAME_SIZE[0] * FRAME_SIZE[1] * 3
+
+# Stride-scheduling weights: a critical gate gets 8x the detections of a
+# low-priority one while the pool is contended, and nobody starves.
+PRIORITIES = {"low": 1, "normal": 2, "high": 4, "critical": 8}
+DEFAULT_PRIORITY = "normal"
+
+
+def resolve_priority(name=None) -> str:
+    name = name or DEFAULT_PRIORITY
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{name}' (expected one of {', '.join(PRIORITIES)})")
+    return name
+
+
+class FrameRing:
+    # Fixed ring of FRAME_SIZE BGR slots; crops (ROI) use a slot prefix.
+    def __init__(self, slots=RING_SLOTS):
+        self.slots = max(2, slots)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * SLOT_BYTES)
+        self.name = self.shm.name
+        self._next = 0
+
+    def write(self, image):
+        if image.nbytes > SLOT_BYTES:
+            raise ValueError(f"Frame of {image.shape} does not fit a {FRAME_SIZE} slot")
+        slot = self._next
+        self._next = (self._next + 1) % self.slots
+        view = np.ndarray(image.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * SLOT_BYTES)
+        view[...] = image
+        del view
+        return slot * SLOT_BYTES
+
+    def close(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class CameraLease:
+    # One camera's handle on the scheduler. Quacks like a detector, so it can
+    # sit inside MotionGatedDetector in place of the in-process model.
+    batch_size = 1
+
+    def __init__(self, scheduler, label, detector_name, priority, on_shed=None):
+        self.scheduler = scheduler
+        self.label = label
+        self.detector_name = resolve_detector_name(detector_name, strict=False)
+        self.priority = resolve_priority(priority)
+        self.ring = FrameRing()
+        self.pass_value = 0.0
+        self.min_interval = 0.0
+        self.detections = 0
+        self.backend = self.detector_name
+        self.errors = 0
+        self.shed = False  # True when the last detect() was answered from cache
+        self._on_shed = on_shed
+        self._boxes = []
+        self._last_admitted = 0.0
+        self._fallback_warned = False
+
+    @property
+    def weight(self):
+        return PRIORITIES[self.priority]
+
+    def set_priority(self, priority):
+        self.priority = resolve_priority(priority)
+
+    def admit(self) -> bool:
+        # Backpressure: while the pool is saturated each camera is held to its
+        # weighted share of pool throughput; the extra frames reuse old boxes.
+        now = time.monotonic()
+        if not self.scheduler.saturated() or now - self._last_admitted >= self.min_interval:
+            self._last_admitted = now
+            return True
+        return False
+
+    def detect(self, frame):
+        # Only the pool submit is throttled: the caller still decodes and
+        # publishes the frame, it just gets the previous boxes back.
+        self.shed = not self.admit()
+        if self.shed:
+            if self._on_shed:
+                self._on_shed()
+            return self._boxes
+
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        request = self.scheduler.submit(self, self.ring.write(frame), frame.shape)
+        if request.done.wait(DETECTION_TIMEOUT_SECONDS):
+            self.detections += 1
+            self.backend = request.backend or self.backend
+            if request.error:
+                # The worker survived the failure; report it, keep streaming.
+                if not self.errors:
+                    print(f"⚠️ Detection failed for {self.label}: {request.error}")
+                self.errors += 1
+            self._boxes = request.boxes
+            return self._boxes
+
+        self.scheduler.abandon(request)
+        if not self._fallback_warned:
+            print(f"⚠️ Detection pool timed out for {self.label}; detecting in-process")
+            self._fallback_warned = True
+        try:
+            self._boxes = get_detector(self.detector_name).detect(frame)
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ In-process detection failed for {self.label}: {e}")
+            self._boxes = []
+        return self._boxes
+
+    def detect_batch(self, frames):
+        return [self.detect(frame) for frame in frames]
+
+    def stats(self) -> dict:
+        return {
+            "priority": self.priority,
+            "backend": self.backend,
+            "detections": self.detections,
+            "errors": self.errors,
+            "fpsLimit": round(1.0 / self.min_interval, 2) if self.min_interval and self.scheduler.saturated() else None,
+        }
+
+    def close(self):
+        self.scheduler.release(self)
+
+
+class _Request:
+    __slots__ = ("id", "lease", "offset", "shape", "queued_at", "done", "boxes", "backend", "error")
+
+    def __init__(self, request_id, lease, offset, shape):
+        self.id = request_id
+        self.lease = lease
+        self.offset = offset
+        self.shape = shape
+        self.queued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.boxes = []
+        self.backend = None
+        self.error = None
+
+
+class DetectionScheduler:
+    def __init__(self, workers=DETECTION_WORKERS):
+        self.workers = max(1, workers)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._procs = []
+        self._cond = threading.Condition()
+        self._leases = set()
+        self._pending = {}
+        self._running = {}
+        self._ids = itertools.count(1)
+        self._virtual_time = 0.0
+        self._detect_seconds = 0.0
+        self._saturated_until = 0.0
+        self._closed = False
+
+        for _ in range(self.workers):
+            self._spawn()
+        self._collector = threading.Thread(target=self._collect, name="detection-collector", daemon=True)
+        self._collector.start()
+
+    def _spawn(self):
+        proc = self._ctx.Process(target=_worker_main, args=(self._tasks, self._results), daemon=True)
+        proc.start()
+        self._procs.append(proc)
+
+    def register(self, label, detector_name=None, priority=None, on_shed=None) -> CameraLease:
+        lease = CameraLease(self, label, detector_name, priority, on_shed)
+        with self._cond:
+            # New cameras join at the current virtual time instead of 0, so
+            # they cannot monopolise the pool while catching up.
+            lease.pass_value = self._virtual_time
+            self._leases.add(lease)
+            self._rebalance()
+        return lease
+
+    def release(self, lease):
+        with self._cond:
+            self._leases.discard(lease)
+            self._pending.pop(lease, None)
+            self._rebalance()
+        lease.ring.close()
+
+    def saturated(self) -> bool:
+        return time.monotonic() < self._saturated_until
+
+    def submit(self, lease, offset, shape) -> _Request:
+        request = _Request(next(self._ids), lease, offset, shape)
+        with self._cond:
+            if len(self._running) >= self.workers:
+                self._saturated_until = time.monotonic() + SATURATION_HOLD_SECONDS
+            self._pending[lease] = request
+            self._dispatch()
+        return request
+
+    def abandon(self, request):
+        # Frees the capacity of a request whose worker died or hung.
+        with self._cond:
+            if self._pending.get(request.lease) is request:
+                del self._pending[request.lease]
+            self._running.pop(request.id, None)
+            self._dispatch()
+
+    def _dispatch(self):
+        # Called with _cond held: fill idle workers, lowest pass value first.
+        while self._pending and len(self._running) < self.workers:
+            lease = min(self._pending, key=lambda item: (item.pass_value, -item.weight))
+            request = self._pending.pop(lease)
+            self._virtual_time = lease.pass_value
+            lease.pass_value += 1.0 / lease.weight
+            self._running[request.id] = request
+            metrics.DETECTION_QUEUE_SECONDS.observe(time.perf_counter() - request.queued_at)
+            self._tasks.put((request.id, lease.ring.name, request.offset, request.shape, lease.detector_name))
+        metrics.DETECTION_BUSY_WORKERS.set(len(self._running))
+
+    def _rebalance(self):
+        # Called with _cond held: weighted share of the measured pool rate.
+        if not self._leases or not self._detect_seconds:
+            return
+        capacity = self.workers / self._detect_seconds
+        total = sum(lease.weight for lease in self._leases)
+        for lease in self._leases:
+            lease.min_interval = total / (capacity * lease.weight)
+
+    def _collect(self):
+        next_reap = time.monotonic() + REAP_INTERVAL_SECONDS
+        while not self._closed:
+            # Dead workers are replaced on a timer, busy or not.
+            if time.monotonic() >= next_reap:
+                self._reap()
+                next_reap = time.monotonic() + REAP_INTERVAL_SECONDS
+            try:
+                request_id, boxes, seconds, backend, error = self._results.get(timeout=REAP_INTERVAL_SECONDS)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            with self._cond:
+                request = self._running.pop(request_id, None)
+                self._detect_seconds = seconds if not self._detect_seconds else 0.9 * self._detect_seconds + 0.1 * seconds
+                self._rebalance()
+                self._dispatch()
+            if request is not None:
+                request.boxes = [tuple(box) for box in boxes]
+                request.backend = backend
+                request.error = error
+                request.done.set()
+
+    def _reap(self):
+        for proc in list(self._procs):
+            if not proc.is_alive() and not self._closed:
+                self._procs.remove(proc)
+                print(f"⚠️ Detection worker exited ({proc.exitcode}); restarting")
+                self._spawn()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "busy": len(self._running),
+                "queued": len(self._pending),
+                "cameras": len(self._leases),
+                "saturated": self.saturated(),
+                "msPerDetection": round(self._detect_seconds * 1000, 2),
+            }
+
+    def shutdown(self):
+        self._closed = True
+        for _ in self._procs:
+            self._tasks.put(None)
+        for proc in self._procs:
+            proc.join(timeout=2)
+            if proc.is_alive():
+                proc.terminate()
+        with self._cond:
+            for request in list(self._pending.values()) + list(self._running.values()):
+                request.done.set()
+            leases = list(self._leases)
+            self._leases.clear()
+        for lease in leases:
+            lease.ring.close()
+
+
+def _worker_main(tasks, results):
+    # Runs in each spawned process: attach to camera rings on demand and keep
+    # the handles until a ring has been idle for a while. One OpenCV thread
+    # per process: the pool itself is the parallelism.
+    cv2.setNumThreads(1)
+    rings = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        request_id, ring_name, offset, shape, detector_name = task
+        started = time.perf_counter()
+        boxes = []
+        backend = None
+        error = None
+        try:
+            if ring_name not in rings:
+                rings[ring_name] = [shared_memory.SharedMemory(name=ring_name), started]
+            shm = rings[ring_name][0]
+            rings[ring_name][1] = started
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+            detector = get_detector(detector_name)
+            backend = detector.name
+            boxes = [[int(v) for v in box] for box in detector.detect(frame)]
+            del frame
+        except FileNotFoundError:
+            pass  # the camera stopped and unlinked its ring meanwhile
+        except Exception as e:
+            # A bad frame must not take the worker (and its queue slot) down.
+            boxes = []
+            error = f"{type(e).__name__}: {e}"
+        results.put((request_id, boxes, time.perf_counter() - started, backend, error))
+
+        for name, (shm, used_at) in list(rings.items()):
+            if started - used_at > RING_IDLE_SECONDS:
+                shm.close()
+                del rings[name]
+
+    for shm, _ in rings.values():
+        shm.close()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    # None when DETECTION_WORKERS=0: cameras then detect in their own thread.
+    global _scheduler
+    if DETECTION_WORKERS <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = DetectionScheduler(DETECTION_WORKERS)
+        return _scheduler
+
+
+def scheduler_stats():
+    return _scheduler.stats() if _scheduler is not None else {"workers": 0}
+
+
+def shutdown_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.shutdown()
+            _scheduler = None
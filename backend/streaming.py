@@ -0,0 +1,384 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import cv2
+from fastapi.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketDisconnect
+from vision import FRAME_SIZE, annotate_frame
+from detectors import get_detector, resolve_detector_name
+from motion import MotionGatedDetector, roi_key
+from tracker import PersonTracker
+from timeseries import record_sample
+from scheduler import get_scheduler
+from database import submit
+from encoding import DEFAULT_QUALITY, AdaptiveQuality, encode_packet
+import metrics
+
+# =====================================================
+# SHARED LIVE PIPELINE (ONE WORKER PER CAMERA + MODE)
+# =====================================================
+# Every viewer of the same gate/mode subscribes to one background worker
+# that captures, detects and encodes once, then fans the JPEG out.
+IDLE_GRACE_SECONDS = float(os.getenv("STREAM_IDLE_GRACE_SECONDS", "10"))
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("SAMPLE_INTERVAL_SECONDS", "10"))
+
+_workers = {}
+_workers_lock = threading.Lock()
+# (user_email, gate) -> the one worker that writes its crowd samples. Object
+# and thermal viewers of a gate run separate workers over the same frames;
+# only one may feed the rollups or footfall and dwell are counted twice.
+_sample_writers = {}
+
+
+def stream_key(camera_url, mode, detector=None, roi=None):
+    return (camera_url, "thermal" if mode == "thermal" else "object", resolve_detector_name(detector, strict=False), roi_key(roi))
+
+
+class CameraWorker:
+    def __init__(self, camera_url, mode, detector=None, roi=None, label=None, priority=None):
+        self.key = stream_key(camera_url, mode, detector, roi)
+        self.camera_url = camera_url
+        # Metrics label from camera_label(), never the (credential-bearing) RTSP URL.
+        self.label = label or "unnamed"
+        self.mode = self.key[1]
+        self.detector_name = self.key[2]
+        self.roi = self.key[3]
+        self.priority = priority
+        self.gated = None
+        self.lease = None
+        self.tracker = PersonTracker()
+        self.owners = set()
+        self.running = False
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._last_publish = None
+        self.frame_interval = 0.0
+        self._viewers = 0
+        self._waiters = {}  # asyncio.Event -> its event loop, one per viewer
+        self._idle_since = time.monotonic()
+        self._thread = None
+        self._dropped = metrics.CAMERA_DROPPED_FRAMES.labels(self.label, self.mode)
+        self._shed = metrics.CAMERA_SHED_FRAMES.labels(self.label, self.mode)
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f"camera-{self.mode}", daemon=True)
+        self._thread.start()
+
+    def add_viewer(self, owner=None):
+        with self._cond:
+            if not self.running:
+                return False
+            self._viewers += 1
+            metrics.ACTIVE_VIEWERS.inc()
+            if owner:
+                self.owners.add(owner)
+            return True
+
+    def remove_viewer(self):
+        with self._cond:
+            self._viewers -= 1
+            metrics.ACTIVE_VIEWERS.dec()
+            if self._viewers == 0:
+                self._idle_since = time.monotonic()
+
+    def set_priority(self, priority):
+        self.priority = priority
+        if self.lease is not None:
+            self.lease.set_priority(priority)
+
+    def stats(self) -> dict:
+        gated = self.gated
+        lease = self.lease
+        return {
+            "mode": self.mode,
+            # The backend that actually ran (a broken DNN model falls back to HOG).
+            "detector": lease.backend if lease else (gated.detector.name if gated else self.detector_name),
+            "viewers": self._viewers,
+            "framesProcessed": gated.frames if gated else 0,
+            "framesSkipped": gated.skipped if gated else 0,
+            "skipRatio": gated.skip_ratio if gated else 0.0,
+            "tracking": self.tracker.summary(),
+            "scheduler": lease.stats() if lease else None,
+        }
+
+    def subscribe(self):
+        # Viewers wait on an asyncio.Event set from the camera thread, so a
+        # connected client holds no worker thread between frames.
+        event = asyncio.Event()
+        with self._cond:
+            self._waiters[event] = asyncio.get_running_loop()
+        return event
+
+    def unsubscribe(self, event):
+        with self._cond:
+            self._waiters.pop(event, None)
+
+    def _wake(self):
+        # Called with _cond held.
+        for event, loop in self._waiters.items():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # that viewer's loop is already closed
+
+    async def next_frame(self, event, last_seq):
+        # Only the newest frame is kept, so a slow client simply skips
+        # whatever was published while it was still sending.
+        while True:
+            event.clear()
+            with self._cond:
+                if self._seq != last_seq:
+                    if last_seq and self._seq - last_seq > 1:
+                        self._dropped.inc(self._seq - last_seq - 1)
+                    return self._frame, self._seq
+                if not self.running:
+                    return None, last_seq
+            await event.wait()
+
+    def _publish(self, packet):
+        now = time.perf_counter()
+        if self._last_publish is not None:
+            # Smoothed publish period: the time budget a client has per frame.
+            self.frame_interval = 0.9 * self.frame_interval + 0.1 * (now - self._last_publish)
+        self._last_publish = now
+
+        with self._cond:
+            self._frame = packet
+            self._seq += 1
+            self._wake()
+            if self._viewers == 0 and time.monotonic() - self._idle_since > IDLE_GRACE_SECONDS:
+                self.running = False
+            return self.running
+
+    def _record(self, count):
+        # Peak count of the last interval, stored once per (account, gate),
+        # with the tracker's footfall and dwell deltas for the same interval.
+        traffic = self.tracker.interval()
+        for owner in list(self.owners):
+            if _sample_writers.get(owner) is not self:
+                continue
+            user_email, gate = owner
+            future = submit(record_sample(user_email, gate, count, source="live", traffic=traffic))
+            if future:
+                future.add_done_callback(_log_sample_error)
+
+    def _run(self):
+        source = 0 if self.camera_url == "0" else self.camera_url
+        cap = cv2.VideoCapture(source)
+        scheduler = get_scheduler()
+        if scheduler is not None:
+            self.lease = scheduler.register(self.label, self.detector_name, self.priority, self._shed.inc)
+        self.gated = MotionGatedDetector(self.lease or get_detector(self.detector_name), self.roi, FRAME_SIZE)
+        interval_peak = 0
+        next_sample_at = time.monotonic() + SAMPLE_INTERVAL_SECONDS
+        fps_frames = 0
+        fps_since = time.perf_counter()
+        frames_counter = metrics.CAMERA_FRAMES.labels(self.label, self.mode)
+        fps_gauge = metrics.CAMERA_FPS.labels(self.label, self.mode)
+        metrics.ACTIVE_STREAMS.inc()
+
+        try:
+            while self.running:
+                t0 = time.perf_counter()
+                success, frame = cap.read()
+                t1 = time.perf_counter()
+                metrics.STAGE_READ.observe(t1 - t0)
+                if not success:
+                    break
+
+                frame = cv2.resize(frame, FRAME_SIZE)
+                t2 = time.perf_counter()
+                metrics.STAGE_RESIZE.observe(t2 - t1)
+                boxes = self.gated.detect(frame)
+                t3 = time.perf_counter()
+                metrics.STAGE_DETECT.observe(t3 - t2)
+                track_ids = self.tracker.update(boxes, time.monotonic())
+                metrics.STAGE_TRACK.observe(time.perf_counter() - t3)
+
+                interval_peak = max(interval_peak, len(boxes))
+                if time.monotonic() >= next_sample_at:
+                    self._record(interval_peak)
+                    interval_peak = 0
+                    next_sample_at = time.monotonic() + SAMPLE_INTERVAL_SECONDS
+
+                t3 = time.perf_counter()
+                annotated = annotate_frame(frame.copy(), boxes, self.mode)
+                t4 = time.perf_counter()
+                metrics.STAGE_ANNOTATE.observe(t4 - t3)
+                ret, buffer = cv2.imencode('.jpg', annotated)
+                t5 = time.perf_counter()
+                metrics.STAGE_ENCODE.observe(t5 - t4)
+
+                frames_counter.inc()
+                fps_frames += 1
+                if t5 - fps_since >= 1.0:
+                    fps_gauge.set(fps_frames / (t5 - fps_since))
+                    fps_frames = 0
+                    fps_since = t5
+
+                if not ret:
+                    continue
+
+                packet = {
+                    "mode": self.mode,
+                    "raw": frame,
+                    "annotated": annotated,
+                    "boxes": [[int(v) for v in box] for box in boxes],
+                    "tracks": track_ids.tolist(),
+                    "jpeg": buffer.tobytes(),
+                    "cache": {},
+                }
+                if not self._publish(packet):
+                    break
+        finally:
+            cap.release()
+            if self.lease is not None:
+                self.lease.close()
+            metrics.ACTIVE_STREAMS.dec()
+            try:
+                metrics.CAMERA_FPS.remove(self.label, self.mode)
+            except KeyError:
+                pass  # another worker for the same gate already cleared it
+            with self._cond:
+                self.running = False
+                self._wake()
+            with _workers_lock:
+                if _workers.get(self.key) is self:
+                    del _workers[self.key]
+                _hand_over_samples(self)
+
+
+def camera_label(owner):
+    # Gate names repeat across accounts ("Gate 1"), so the label carries a
+    # short hash of the account too, without putting the email in metrics.
+    if not owner:
+        return None
+    user_email, gate = owner
+    digest = hashlib.sha1(f"{user_email}\0{gate}".encode()).hexdigest()[:8]
+    return f"{gate}#{digest}"
+
+
+def _log_sample_error(future):
+    if not future.cancelled() and future.exception():
+        print(f"Sample Error: {future.exception()}")
+
+
+def _hand_over_samples(stopped):
+    # Called with _workers_lock held: another running worker of the same
+    # gate takes over sampling, or the gate has no live writer left.
+    for owner in [o for o, w in _sample_writers.items() if w is stopped]:
+        successor = next((w for w in _workers.values() if owner in w.owners and w.running), None)
+        if successor is None:
+            del _sample_writers[owner]
+        else:
+            _sample_writers[owner] = successor
+
+
+def acquire_worker(camera_url, mode="object", detector=None, roi=None, owner=None, priority=None):
+    key = stream_key(camera_url, mode, detector, roi)
+    with _workers_lock:
+        worker = _workers.get(key)
+        if worker is None or not worker.add_viewer(owner):
+            worker = CameraWorker(camera_url, mode, detector, roi, camera_label(owner), priority)
+            worker.start()
+            worker.add_viewer(owner)
+            _workers[key] = worker
+        elif priority and priority != worker.priority:
+            worker.set_priority(priority)
+        if owner:
+            _sample_writers.setdefault(owner, worker)
+        return worker
+
+
+def stream_stats(camera_url) -> list:
+    with _workers_lock:
+        return [worker.stats() for key, worker in _workers.items() if key[0] == camera_url]
+
+
+def _frame_budget(worker, max_fps):
+    return max(worker.frame_interval, 1.0 / max_fps if max_fps else 0.0)
+
+
+def _throttle_delay(sent_at, max_fps):
+    if not max_fps:
+        return 0.0
+    return max(0.0, 1.0 / max_fps - (time.perf_counter() - sent_at))
+
+
+async def generate_frames(camera_url, mode="object", detector=None, roi=None, owner=None,
+                          quality=DEFAULT_QUALITY, scale=1.0, max_fps=None, adaptive=True, priority=None):
+    worker = acquire_worker(camera_url, mode, detector, roi, owner, priority)
+    controller = AdaptiveQuality(quality, scale, adaptive)
+    event = worker.subscribe()
+    last_seq = 0
+
+    try:
+        while True:
+            packet, last_seq = await worker.next_frame(event, last_seq)
+            if packet is None:
+                break
+
+            jpeg = await run_in_threadpool(encode_packet, packet, *controller.current)
+            sent_at = time.perf_counter()
+            # Resumes once the server has handed the chunk to a draining client.
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+            controller.update(time.perf_counter() - sent_at, _frame_budget(worker, max_fps))
+
+            delay = _throttle_delay(sent_at, max_fps)
+            if delay:
+                await asyncio.sleep(delay)
+    finally:
+        worker.unsubscribe(event)
+        worker.remove_viewer()
+
+
+async def stream_websocket(websocket, camera_url, mode="object", detector=None, roi=None, owner=None,
+                           quality=DEFAULT_QUALITY, scale=1.0, max_fps=None, adaptive=True, priority=None):
+    # Binary protocol: a JSON text header ({seq, count, boxes, tracks, ...}) followed by
+    # the JPEG of the raw frame; the client draws its own overlays.
+    worker = acquire_worker(camera_url, mode, detector, roi, owner, priority)
+    controller = AdaptiveQuality(quality, scale, adaptive)
+    event = worker.subscribe()
+    last_seq = 0
+
+    try:
+        while True:
+            packet, last_seq = await worker.next_frame(event, last_seq)
+            if packet is None:
+                break
+
+            frame_quality, frame_scale = controller.current
+            jpeg = await run_in_threadpool(encode_packet, packet, frame_quality, frame_scale, True)
+            height, width = packet["raw"].shape[:2]
+            header = {
+                "seq": last_seq,
+                "mode": packet["mode"],
+                "count": len(packet["boxes"]),
+                "boxes": [[round(v * frame_scale) for v in box] for box in packet["boxes"]],
+                "tracks": packet["tracks"],
+                "occupancy": worker.tracker.occupancy,
+                "width": round(width * frame_scale),
+                "height": round(height * frame_scale),
+                "quality": frame_quality,
+                "bytes": len(jpeg),
+            }
+
+            sent_at = time.perf_counter()
+            await websocket.send_text(json.dumps(header))
+            await websocket.send_bytes(jpeg)
+            controller.update(time.perf_counter() - sent_at, _frame_budget(worker, max_fps))
+
+            delay = _throttle_delay(sent_at, max_fps)
+            if delay:
+                await asyncio.sleep(delay)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        worker.unsubscribe(event)
+        worker.remove_viewer()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules (uvicorn runs
+# from backend/), so the tests do the same.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
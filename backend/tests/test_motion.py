@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from detectors import MIN_CROP_SIZE, HogDetector
+from motion import MotionGatedDetector, validate_roi
+
+FRAME_SIZE = (640, 480)
+WALKWAY_STRIP = [(0, 200), (639, 200), (639, 270), (0, 270)]
+
+
+class RecordingDetector:
+    def __init__(self):
+        self.shapes = []
+
+    def detect(self, frame):
+        self.shapes.append(frame.shape)
+        return []
+
+
+def frame():
+    return np.random.default_rng(0).integers(0, 255, (FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+
+
+def test_validate_roi_accepts_polygon_inside_frame():
+    validate_roi(None, FRAME_SIZE)
+    validate_roi(WALKWAY_STRIP, FRAME_SIZE)
+
+
+@pytest.mark.parametrize("roi", [
+    [(0, 0), (100, 0)],
+    [(0, 0), (640, 0), (640, 100)],
+    [(-1, 0), (100, 0), (100, 100)],
+    [(0, 0), (100, 100), (200, 200)],
+])
+def test_validate_roi_rejects_bad_polygons(roi):
+    with pytest.raises(ValueError):
+        validate_roi(roi, FRAME_SIZE)
+
+
+@pytest.mark.parametrize("roi", [
+    WALKWAY_STRIP,
+    [(10, 10), (74, 10), (74, 74), (10, 74)],
+    [(600, 300), (639, 300), (639, 479), (600, 479)],
+    [(300, 460), (428, 460), (428, 479), (300, 479)],
+])
+def test_undersized_roi_crop_is_grown_to_detector_window(roi):
+    detector = RecordingDetector()
+    gated = MotionGatedDetector(detector, roi, FRAME_SIZE, motion_gate=False)
+    gated.detect(frame())
+
+    height, width = detector.shapes[0][:2]
+    assert width >= MIN_CROP_SIZE[0] and height >= MIN_CROP_SIZE[1]
+    x, y, w, h = gated.rect
+    assert 0 <= x and x + w <= FRAME_SIZE[0]
+    assert 0 <= y and y + h <= FRAME_SIZE[1]
+
+
+def test_hog_runs_on_walkway_strip():
+    gated = MotionGatedDetector(HogDetector(), WALKWAY_STRIP, FRAME_SIZE, motion_gate=False)
+    assert gated.detect(frame()) == []
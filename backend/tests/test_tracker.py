@@ -0,0 +1,89 @@
+import pytest
+from tracker import PersonTracker, merge_segments
+
+FPS = 10
+
+
+def run_segment(frames, start, end, hold_edges=True):
+    # frames[i] is the list of (x, y, w, h) boxes at t = i / FPS.
+    tracker = PersonTracker(hold_edges=hold_edges)
+    for index in range(start, end):
+        tracker.update(frames[index], index / FPS)
+    tracker.finish()
+    return {
+        "start": start,
+        "end": end,
+        "entered": tracker.entered,
+        "openingSpans": tracker.opening_spans,
+        "closingSpans": tracker.closing_spans,
+        "dwell": tracker.dwell.summary(),
+    }
+
+
+def test_standing_person_split_across_segments_is_one_dwell():
+    frames = [[(100, 100, 40, 100)]] * (20 * FPS)
+
+    whole = run_segment(frames, 0, len(frames))
+    merged_whole = merge_segments([whole])
+    merged = merge_segments([run_segment(frames, 0, 10 * FPS), run_segment(frames, 10 * FPS, 20 * FPS)])
+
+    assert merged_whole["entered"] == 1
+    assert merged_whole["dwell"]["count"] == 1
+    assert merged_whole["dwell"]["avgSeconds"] == pytest.approx(19.9, abs=0.05)
+    assert merged["entered"] == 1
+    assert merged["dwell"]["count"] == 1
+    assert merged["dwell"]["avgSeconds"] == pytest.approx(19.9, abs=0.05)
+
+
+def test_person_spanning_three_segments_is_joined_twice():
+    frames = [[(100, 100, 40, 100)]] * (30 * FPS)
+    segments = [run_segment(frames, i * 10 * FPS, (i + 1) * 10 * FPS) for i in range(3)]
+
+    merged = merge_segments(segments)
+
+    assert merged["entered"] == 1
+    assert merged["dwell"]["count"] == 1
+    assert merged["dwell"]["avgSeconds"] == pytest.approx(29.9, abs=0.05)
+
+
+def test_people_away_from_the_cut_are_not_joined():
+    # One person only in the first half, another only in the second.
+    frames = [[(100, 100, 40, 100)] if t < 6 * FPS else [] for t in range(10 * FPS)]
+    frames += [[(400, 100, 40, 100)] if t > 4 * FPS else [] for t in range(10 * FPS)]
+
+    merged = merge_segments([run_segment(frames, 0, 10 * FPS), run_segment(frames, 10 * FPS, 20 * FPS)])
+
+    assert merged["entered"] == 2
+    assert merged["dwell"]["count"] == 2
+
+
+def test_live_tracker_counts_entries_occupancy_and_dwell():
+    tracker = PersonTracker()
+    for i in range(60):
+        boxes = [(10 + i * 3, 50, 40, 100)]
+        if i < 20:
+            boxes.append((400 - i * 2, 60, 40, 100))
+        tracker.update(boxes, i / FPS)
+
+    assert tracker.entered == 2
+    assert tracker.occupancy == 1
+    assert tracker.dwell.count == 1
+    assert tracker.dwell.total_seconds == pytest.approx(1.9)
+
+    tracker.finish()
+    assert tracker.occupancy == 0
+    assert tracker.dwell.count == 2
+
+
+def test_different_people_either_side_of_a_cut_are_not_joined():
+    # A stands at x=100 until 9.5 s; B appears at x=500 from 10.2 s.
+    frames = [[(100, 100, 40, 100)] if t <= 95 else [] for t in range(10 * FPS)]
+    frames += [[(500, 100, 40, 100)] if t >= 102 else [] for t in range(10 * FPS, 20 * FPS)]
+
+    whole = merge_segments([run_segment(frames, 0, len(frames))])
+    merged = merge_segments([run_segment(frames, 0, 10 * FPS), run_segment(frames, 10 * FPS, 20 * FPS)])
+
+    assert whole["entered"] == 2
+    assert merged["entered"] == 2
+    assert merged["dwell"]["count"] == 2
+    assert merged["dwell"]["totalSeconds"] == pytest.approx(whole["dwell"]["totalSeconds"], abs=0.05)
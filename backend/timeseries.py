@@ -0,0 +1,102 @@
+import os
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+from database import db
+
+# =====================================================
+# CROWD COUNT TIME SERIES + ROLLUPS
+# =====================================================
+# Raw samples go to a time-series collection (plain collection + TTL index
+# on servers without time-series support). Every sample is also folded
+# into minute/hour/day rollup documents so analytics never scans samples.
+SAMPLES = "crowd_samples"
+ROLLUPS = "crowd_rollups"
+SAMPLE_RETENTION_DAYS = int(os.getenv("SAMPLE_RETENTION_DAYS", "30"))
+
+PERIODS = {
+    "minute": timedelta(days=2),
+    "hour": timedelta(days=90),
+    "day": None,  # kept forever
+}
+
+
+def truncate(ts, period):
+    if period == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if period == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def ensure_collections():
+    retention = SAMPLE_RETENTION_DAYS * 86400
+    try:
+        await db.create_collection(
+            SAMPLES,
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "seconds"},
+            expireAfterSeconds=retention
+        )
+    except CollectionInvalid:
+        pass
+    except OperationFailure as e:
+        print(f"⚠️ Time-series collections unavailable, using a bucketed collection: {e}")
+        await db[SAMPLES].create_index([("ts", ASCENDING)], expireAfterSeconds=retention)
+        await db[SAMPLES].create_index([("meta.user_email", ASCENDING), ("meta.gate", ASCENDING), ("ts", ASCENDING)])
+
+    await db[ROLLUPS].create_index(
+        [("user_email", ASCENDING), ("period", ASCENDING), ("bucket", ASCENDING), ("gate", ASCENDING)],
+        unique=True
+    )
+    await db[ROLLUPS].create_index([("expiresAt", ASCENDING)], expireAfterSeconds=0)
+
+
+def rollup_updates(user_email, gate, count, ts, traffic=None) -> list:
+    # traffic: tracker deltas for the sample (entered, dwellCount, dwellSeconds).
+    increments = {"samples": 1, "sum": count}
+    if traffic:
+        increments.update({
+            "entered": traffic["entered"],
+            "dwellCount": traffic["dwellCount"],
+            "dwellSeconds": traffic["dwellSeconds"],
+        })
+
+    updates = []
+    for period, keep_for in PERIODS.items():
+        bucket = truncate(ts, period)
+        update = {
+            "$inc": increments,
+            "$max": {"peak": count},
+            "$set": {"last": count, "lastAt": ts},
+        }
+        if keep_for:
+            update["$setOnInsert"] = {"expiresAt": bucket + keep_for}
+        updates.append(UpdateOne(
+            {"user_email": user_email, "gate": gate, "period": period, "bucket": bucket},
+            update,
+            upsert=True
+        ))
+    return updates
+
+
+async def record_sample(user_email, gate, count, source="live", ts=None, traffic=None):
+    ts = ts or datetime.utcnow()
+    sample = {
+        "ts": ts,
+        "meta": {"user_email": user_email, "gate": gate, "source": source},
+        "count": count,
+    }
+    if traffic:
+        sample.update(traffic)
+    await db[SAMPLES].insert_one(sample)
+    await db[ROLLUPS].bulk_write(rollup_updates(user_email, gate, count, ts, traffic), ordered=False)
+
+
+async def load_rollups(user_email, period, since) -> list:
+    # Served entirely by the (user_email, period, bucket) index.
+    cursor = db[ROLLUPS].find(
+        {"user_email": user_email, "period": period, "bucket": {"$gte": truncate(since, period)}},
+        {"_id": 0, "gate": 1, "bucket": 1, "peak": 1, "sum": 1, "samples": 1, "last": 1,
+         "entered": 1, "dwellCount": 1, "dwellSeconds": 1}
+    )
+    return await cursor.to_list(None)
@@ -0,0 +1,319 @@
+import os
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy is optional; greedy matching needs only NumPy
+    linear_sum_assignment = None
+
+# =====================================================
+# PERSON TRACKER (FOOTFALL / OCCUPANCY / DWELL)
+# =====================================================
+# Associates each frame's boxes with the tracks of the previous frames via
+# a vectorized IoU + centroid cost matrix. Tracks live in flat NumPy arrays
+# (one row per track, compacted on expiry) rather than per-object dicts.
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+TRACK_MAX_DISTANCE = float(os.getenv("TRACK_MAX_DISTANCE", "0.75"))  # in box diagonals
+TRACK_MAX_AGE_SECONDS = float(os.getenv("TRACK_MAX_AGE_SECONDS", "1.5"))
+TRACK_MIN_HITS = int(os.getenv("TRACK_MIN_HITS", "3"))
+TRACK_MATCHER = os.getenv("TRACK_MATCHER", "greedy")
+MATCHERS = ("greedy", "hungarian")
+DWELL_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1800)
+INITIAL_CAPACITY = 64
+
+
+def resolve_matcher(name=None) -> str:
+    name = name or TRACK_MATCHER
+    if name not in MATCHERS:
+        raise ValueError(f"Unknown matcher '{name}' (expected one of {', '.join(MATCHERS)})")
+    if name == "hungarian" and linear_sum_assignment is None:
+        print("⚠️ scipy not installed, using greedy track matching")
+        return "greedy"
+    return name
+
+
+def _to_corners(boxes):
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    corners = boxes.copy()
+    corners[:, 2:] += boxes[:, :2]
+    return corners
+
+
+def _cost_matrix(tracks, dets, iou_threshold, max_distance):
+    # tracks, dets: (x1, y1, x2, y2) rows; inf marks pairs outside the gate.
+    ix1 = np.maximum(tracks[:, None, 0], dets[None, :, 0])
+    iy1 = np.maximum(tracks[:, None, 1], dets[None, :, 1])
+    ix2 = np.minimum(tracks[:, None, 2], dets[None, :, 2])
+    iy2 = np.minimum(tracks[:, None, 3], dets[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    track_wh = tracks[:, 2:] - tracks[:, :2]
+    det_wh = dets[:, 2:] - dets[:, :2]
+    union = track_wh.prod(axis=1)[:, None] + det_wh.prod(axis=1)[None, :] - inter
+    iou = inter / np.maximum(union, 1e-6)
+
+    # Centroid distance in units of the track's diagonal, so sparse
+    # sampling (large jumps between analysed frames) still associates.
+    offset = (tracks[:, None, :2] + tracks[:, None, 2:] - dets[None, :, :2] - dets[None, :, 2:]) / 2
+    diagonal = np.maximum(np.hypot(track_wh[:, 0], track_wh[:, 1]), 1e-6)
+    distance = np.hypot(offset[..., 0], offset[..., 1]) / diagonal[:, None]
+
+    valid = (iou >= iou_threshold) | (distance <= max_distance)
+    return np.where(valid, (1.0 - iou) + distance, np.inf)
+
+
+def _assign(cost, matcher):
+    # Returns matched (row, col) index arrays for a gated cost matrix.
+    if matcher == "hungarian":
+        finite = np.isfinite(cost)
+        rows, cols = linear_sum_assignment(np.where(finite, cost, 1e9))
+        keep = finite[rows, cols]
+        return rows[keep], cols[keep]
+
+    rows, cols = np.nonzero(np.isfinite(cost))
+    order = np.argsort(cost[rows, cols], kind="stable")
+    used_rows = np.zeros(cost.shape[0], dtype=bool)
+    used_cols = np.zeros(cost.shape[1], dtype=bool)
+    matched_rows, matched_cols = [], []
+    # Only candidate pairs are visited, cheapest first.
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if not used_rows[r] and not used_cols[c]:
+            used_rows[r] = used_cols[c] = True
+            matched_rows.append(r)
+            matched_cols.append(c)
+    return np.asarray(matched_rows, dtype=np.intp), np.asarray(matched_cols, dtype=np.intp)
+
+
+class DwellHistogram:
+    def __init__(self, buckets=DWELL_BUCKETS):
+        self.buckets = np.asarray(buckets, dtype=np.float64)
+        self.counts = np.zeros(len(buckets) + 1, dtype=np.int64)
+        self.total_seconds = 0.0
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def add(self, seconds):
+        seconds = np.asarray(seconds, dtype=np.float64)
+        if seconds.size:
+            np.add.at(self.counts, np.searchsorted(self.buckets, seconds), 1)
+            self.total_seconds += float(seconds.sum())
+
+    def summary(self) -> dict:
+        count = self.count
+        edges = [int(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "count": count,
+            "totalSeconds": round(self.total_seconds, 2),
+            "avgSeconds": round(self.total_seconds / count, 2) if count else 0.0,
+            "buckets": [{"le": le, "count": int(c)} for le, c in zip(edges, self.counts)],
+        }
+
+
+class PersonTracker:
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, max_distance=TRACK_MAX_DISTANCE,
+                 max_age=TRACK_MAX_AGE_SECONDS, min_hits=TRACK_MIN_HITS, matcher=None, hold_edges=False):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.min_hits = max(1, min_hits)
+        self.matcher = resolve_matcher(matcher)
+        self.dwell = DwellHistogram()
+        self.entered = 0
+        # Segment mode: tracks touching either end of the tracked span are
+        # kept as spans (times plus first/last box) for merge_segments to join.
+        self.hold_edges = hold_edges
+        self.opening_spans = []  # {"first", "last", "open", "firstBox", "lastBox"}
+        self.closing_spans = []  # {"first", "last", "lastBox"}
+        self._origin = None
+        self._next_id = 1
+        self._n = 0
+        self._allocate(INITIAL_CAPACITY)
+        self._reported = (0, 0, 0.0)
+
+    def _allocate(self, capacity):
+        n = self._n
+        old = getattr(self, "_boxes", None)
+        boxes = np.zeros((capacity, 4), dtype=np.float32)
+        first_boxes = np.zeros((capacity, 4), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        first_seen = np.zeros(capacity, dtype=np.float64)
+        last_seen = np.zeros(capacity, dtype=np.float64)
+        hits = np.zeros(capacity, dtype=np.int32)
+        if old is not None:
+            boxes[:n], first_boxes[:n], ids[:n] = self._boxes[:n], self._first_boxes[:n], self._ids[:n]
+            first_seen[:n], last_seen[:n], hits[:n] = self._first_seen[:n], self._last_seen[:n], self._hits[:n]
+        self._boxes, self._first_boxes, self._ids = boxes, first_boxes, ids
+        self._first_seen, self._last_seen, self._hits = first_seen, last_seen, hits
+
+    @property
+    def occupancy(self):
+        return int(np.count_nonzero(self._hits[:self._n] >= self.min_hits))
+
+    def _cost(self, dets):
+        return _cost_matrix(self._boxes[:self._n], dets, self.iou_threshold, self.max_distance)
+
+    def _match(self, cost):
+        return _assign(cost, self.matcher)
+
+    def _expire(self, now):
+        n = self._n
+        stale = now - self._last_seen[:n] > self.max_age
+        if not stale.any():
+            return
+        confirmed = stale & (self._hits[:n] >= self.min_hits)
+        first, last = self._first_seen[:n][confirmed], self._last_seen[:n][confirmed]
+        if self.hold_edges:
+            opening = first - self._origin <= self.max_age
+            rows = np.flatnonzero(confirmed)[opening]
+            self.opening_spans.extend(self._span(row, still_open=False) for row in rows.tolist())
+            first, last = first[~opening], last[~opening]
+        self.dwell.add(last - first)
+
+        keep = np.flatnonzero(~stale)
+        k = len(keep)
+        for table in (self._boxes, self._first_boxes, self._ids, self._first_seen, self._last_seen, self._hits):
+            table[:k] = table[keep]
+        self._n = k
+
+    def _span(self, row, still_open=None):
+        span = {
+            "first": float(self._first_seen[row]),
+            "last": float(self._last_seen[row]),
+            "lastBox": self._boxes[row].tolist(),
+        }
+        if still_open is not None:
+            span["open"] = still_open
+            span["firstBox"] = self._first_boxes[row].tolist()
+        return span
+
+    def _confirm(self, rows):
+        # Called with the rows whose hit count just reached min_hits.
+        self.entered += len(rows)
+
+    def update(self, boxes, now) -> np.ndarray:
+        # boxes: (x, y, w, h) per person; returns the track id of each box.
+        if self._origin is None:
+            self._origin = now
+        dets = _to_corners(boxes)
+        self._expire(now)
+
+        det_ids = np.zeros(len(dets), dtype=np.int64)
+        matched_dets = np.zeros(len(dets), dtype=bool)
+        if self._n and len(dets):
+            rows, cols = self._match(self._cost(dets))
+            self._boxes[rows] = dets[cols]
+            self._last_seen[rows] = now
+            self._hits[rows] += 1
+            self._confirm(rows[self._hits[rows] == self.min_hits])
+            det_ids[cols] = self._ids[rows]
+            matched_dets[cols] = True
+
+        new = np.flatnonzero(~matched_dets)
+        if len(new):
+            start, end = self._n, self._n + len(new)
+            if end > len(self._ids):
+                self._allocate(max(end, 2 * len(self._ids)))
+            rows = np.arange(start, end)
+            self._boxes[rows] = dets[new]
+            self._first_boxes[rows] = dets[new]
+            self._ids[rows] = np.arange(self._next_id, self._next_id + len(new))
+            self._first_seen[rows] = now
+            self._last_seen[rows] = now
+            self._hits[rows] = 1
+            self._next_id += len(new)
+            self._n = end
+            det_ids[new] = self._ids[rows]
+            if self.min_hits == 1:
+                self._confirm(rows)
+        return det_ids
+
+    def finish(self):
+        # Closes every open track (end of a video): counts their dwell time,
+        # or in segment mode hands them over as closing spans.
+        closing = self.occupancy
+        if self.hold_edges and self._n:
+            n = self._n
+            for row in np.flatnonzero(self._hits[:n] >= self.min_hits).tolist():
+                if self._first_seen[row] - self._origin <= self.max_age:
+                    self.opening_spans.append(self._span(row, still_open=True))
+                else:
+                    self.closing_spans.append(self._span(row))
+            self._n = 0
+        elif self._n:
+            self._expire(np.inf)
+        return closing
+
+    def interval(self) -> dict:
+        # Deltas since the previous call, for periodic time-series samples.
+        entered, dwell_count, dwell_seconds = self.entered, self.dwell.count, self.dwell.total_seconds
+        last_entered, last_count, last_seconds = self._reported
+        self._reported = (entered, dwell_count, dwell_seconds)
+        return {
+            "entered": entered - last_entered,
+            "occupancy": self.occupancy,
+            "dwellCount": dwell_count - last_count,
+            "dwellSeconds": round(dwell_seconds - last_seconds, 2),
+        }
+
+    def summary(self) -> dict:
+        return {
+            "entered": self.entered,
+            "occupancy": self.occupancy,
+            "activeTracks": self._n,
+            "dwell": self.dwell.summary(),
+        }
+
+
+def _pair_spans(carry, opening, iou_threshold, max_distance, matcher):
+    # Matches spans open at a cut with spans opening the next segment by
+    # where they were last / first seen, gated like frame-to-frame tracking.
+    if not carry or not opening:
+        return [], []
+    last_boxes = np.asarray([span["lastBox"] for span in carry], dtype=np.float32).reshape(-1, 4)
+    first_boxes = np.asarray([span["firstBox"] for span in opening], dtype=np.float32).reshape(-1, 4)
+    rows, cols = _assign(_cost_matrix(last_boxes, first_boxes, iou_threshold, max_distance), matcher)
+    return rows.tolist(), cols.tolist()
+
+
+def merge_segments(segments, iou_threshold=TRACK_IOU_THRESHOLD, max_distance=TRACK_MAX_DISTANCE, matcher=None) -> dict:
+    # Joins trackers run (hold_edges=True) over consecutive video segments.
+    # People in view at a cut are tracked on both sides: each span still open
+    # at a segment's end is paired, by position, with a span opening the next
+    # one, counted once in "entered" and given one dwell covering both halves.
+    matcher = resolve_matcher(matcher)
+    segments = sorted(segments, key=lambda s: s["start"])
+    entered = sum(s["entered"] for s in segments)
+    dwell = DwellHistogram()
+    carry = []  # spans open at the previous segment's end
+    previous_end = None
+
+    def close(spans):
+        dwell.add([span["last"] - span["first"] for span in spans])
+
+    for s in segments:
+        dwell.counts += np.asarray([b["count"] for b in s["dwell"]["buckets"]], dtype=np.int64)
+        dwell.total_seconds += s["dwell"]["totalSeconds"]
+
+        opening = s["openingSpans"]
+        if previous_end != s["start"]:
+            close(carry)
+            carry = []
+        rows, cols = _pair_spans(carry, opening, iou_threshold, max_distance, matcher)
+        entered -= len(rows)
+
+        joined = [dict(opening[c], first=carry[r]["first"]) for r, c in zip(rows, cols)]
+        unpaired = [span for index, span in enumerate(opening) if index not in set(cols)]
+        next_carry = list(s["closingSpans"])
+        for span in joined + unpaired:
+            if span["open"]:
+                next_carry.append(span)
+            else:
+                close([span])
+        close([span for index, span in enumerate(carry) if index not in set(rows)])
+        carry = next_carry
+        previous_end = s["end"]
+
+    close(carry)
+    return {"entered": max(entered, 0), "dwell": dwell.summary()}
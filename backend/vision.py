@@ -0,0 +1,29 @@
+import cv2
+
+# =====================================================
+# FRAME ANNOTATION (SHARED BY ALL PIPELINES)
+# =====================================================
+FRAME_SIZE = (640, 480)
+
+def apply_mode(frame, mode="object"):
+    if mode == "thermal":
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        blur = cv2.GaussianBlur(gray, (21, 21), 0)
+        return cv2.applyColorMap(blur, cv2.COLORMAP_JET)
+    return frame
+
+def annotate_frame(frame, boxes, mode="object"):
+    if mode == "thermal":
+        frame = apply_mode(frame, mode)
+
+        for (x, y, w, h) in boxes:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 255), 1)
+        cv2.putText(frame, f"THERMAL COUNT: {len(boxes)}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
+
+    else:
+        for (x, y, w, h) in boxes:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            cv2.putText(frame, "Person", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        cv2.putText(frame, f"LIVE COUNT: {len(boxes)}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+
+    return frame